@@ -1,183 +1,1572 @@
-from flask import Flask, render_template, request
-import matplotlib.pyplot as plt
+from flask import Flask, Response, abort, jsonify, render_template, request, stream_with_context, url_for
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import LineCollection
+from matplotlib.figure import Figure
+from werkzeug.middleware.profiler import ProfilerMiddleware
 import networkx as nx
-import random
-import string
+import numpy as np
+import contextlib
+import gc
+import heapq
+import io
+import ipaddress
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+try:
+    import resource
+except ImportError:  # Not on Windows; jobs then run without a memory limit
+    resource = None
 
 app = Flask(__name__)
+logger = logging.getLogger(__name__)
+
+BROADCAST_MAC = 'ff:ff:ff:ff:ff:ff'
+MAX_FLOWS = 10_000_000  # Largest traffic matrix the load API accepts
+MAX_DEVICES = 100_000  # Largest network a request may build
+MAX_LINKS = 2_000_000  # A full mesh has n(n+1)/2 links, so this caps it near 2000 devices
+JOB_COST = 20_000  # Networks costing more than this (see check_size) are built in a background job
+CONNECTED = -2  # Segment route marker: destination is on the device's own subnet
+UNREACHABLE = -1
+FRAME_OVERHEAD = 26  # Ethernet preamble, header and FCS in bytes
+
+@contextlib.contextmanager
+def gc_paused():
+    # Bulk topology builds allocate hundreds of thousands of objects that all survive,
+    # so generational collections during the build are pure overhead
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+class Metrics:
+    # Wall time of each named phase, aggregated over every run. While tracemalloc is tracing, the
+    # peak memory allocated during each phase is recorded as well; tracemalloc counts the whole
+    # process, so phases running concurrently in other threads inflate each other's peaks
+    def __init__(self):
+        self.phases = {}  # name -> count, total/max/last seconds and peak bytes
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - started
+            peak_bytes = tracemalloc.get_traced_memory()[1] - baseline if tracing else None
+            self.record(name, seconds, peak_bytes)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Phase %s took %.6f s", name, seconds, extra={'phase': name, 'seconds': seconds, 'peak_bytes': peak_bytes})
+
+    def record(self, name, seconds, peak_bytes=None, count=1, total=None):
+        with self._lock:
+            stats = self.phases.get(name)
+            if stats is None:
+                stats = self.phases[name] = {'count': 0, 'total_seconds': 0.0, 'max_seconds': 0.0, 'last_seconds': 0.0, 'peak_bytes': None}
+            stats['count'] += count
+            stats['total_seconds'] += seconds if total is None else total
+            stats['max_seconds'] = max(stats['max_seconds'], seconds)
+            stats['last_seconds'] = seconds
+            if peak_bytes is not None:
+                stats['peak_bytes'] = max(stats['peak_bytes'] or 0, peak_bytes)
+
+    def merge(self, snapshot):
+        # Folds in the phases another process recorded, e.g. a background job's
+        for name, stats in snapshot.items():
+            self.record(name, stats['max_seconds'], stats['peak_bytes'], stats['count'], stats['total_seconds'])
+            with self._lock:
+                self.phases[name]['last_seconds'] = stats['last_seconds']
+
+    def snapshot(self):
+        with self._lock:
+            return {name: dict(stats, mean_seconds=stats['total_seconds'] / stats['count']) for name, stats in self.phases.items()}
+
+    def reset(self):
+        with self._lock:
+            self.phases.clear()
+
+metrics = Metrics()
+
+class JsonFormatter(logging.Formatter):
+    # One JSON object per line, with any extra= fields of the record alongside the message
+    reserved = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+    def format(self, record):
+        entry = {'time': self.formatTime(record), 'level': record.levelname, 'logger': record.name, 'message': record.getMessage()}
+        entry.update((key, value) for key, value in vars(record).items() if key not in self.reserved)
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+def configure_logging(level='INFO', json_output=False):
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter() if json_output else logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+    logging.getLogger().handlers[:] = [handler]
+    logger.setLevel(level.upper() if isinstance(level, str) else level)  # Third-party loggers stay at WARNING
+
+def enable_profiling(profile_dir=None, restrictions=(30,)):
+    # Opt-in: runs every request under cProfile, printing the top functions by cumulative time,
+    # or writing one .prof file per request to profile_dir for snakeviz or pstats
+    if profile_dir is not None:
+        os.makedirs(profile_dir, exist_ok=True)
+    app.wsgi_app = ProfilerMiddleware(app.wsgi_app, restrictions=restrictions, profile_dir=profile_dir, sort_by=('cumulative',))
+
+class EventScheduler:
+    def __init__(self):
+        self.now = 0.0
+        self.events_processed = 0
+        self._queue = []
+        self._sequence = itertools.count()
+
+    def schedule(self, delay, handler, *args):
+        heapq.heappush(self._queue, (self.now + delay, next(self._sequence), handler, args))
+
+    def run(self, until=None):
+        queue = self._queue
+        while queue:
+            if until is not None and queue[0][0] > until:
+                break
+            time, _, handler, args = heapq.heappop(queue)
+            self.now = time
+            self.events_processed += 1
+            handler(*args)
+        return self.now
+
+    def pending(self):
+        return len(self._queue)
+
+class Link:
+    def __init__(self, latency=0.0001, bandwidth=100_000_000):
+        self.latency = latency  # Propagation delay in seconds
+        self.bandwidth = bandwidth  # Bits per second
+        self.busy_until = {}  # Per-direction serialization, keyed by sending device ID
+
+    def arrival_time(self, now, sender_id, size):
+        start = max(now, self.busy_until.get(sender_id, 0.0))
+        finish = start + size * 8 / self.bandwidth
+        self.busy_until[sender_id] = finish
+        return finish + self.latency
+
+class Transfer:
+    def __init__(self, sender, receiver, message, sent_at):
+        self.sender_id = sender.device_id
+        self.receiver_id = receiver.device_id if receiver is not None else None  # None for a broadcast
+        self.receiver_index = receiver.index if receiver is not None else None
+        self.message = message
+        self.sent_at = sent_at
+        self.delivered_at = None
+        self.hops = None
+        self.receptions = 0
+        self.frames_generated = 0
+        self.visited = set()
+
+    @property
+    def broadcast(self):
+        return self.receiver_index is None
+
+    def record_delivery(self, frame, now):
+        self.receptions += 1
+        self.delivered_at = now
+        self.hops = frame.hops if self.hops is None else max(self.hops, frame.hops)
+
+    def result(self):
+        return {
+            'delivered': self.delivered_at is not None,
+            'delivery_time': None if self.delivered_at is None else self.delivered_at - self.sent_at,
+            'hops': self.hops,
+            'frames_generated': self.frames_generated,
+            'receptions': self.receptions,
+        }
+
+class Frame:
+    __slots__ = ('transfer', 'source_mac', 'dest_mac', 'route', 'hops')
+
+    def __init__(self, transfer, source_mac, dest_mac, route=None, hops=0):
+        self.transfer = transfer
+        self.source_mac = source_mac
+        self.dest_mac = dest_mac
+        self.route = route  # Explicit list of device indices for source-routed frames
+        self.hops = hops
+
+    @property
+    def size(self):
+        return len(str(self.transfer.message).encode()) + FRAME_OVERHEAD
+
+    def next_hop(self):
+        return Frame(self.transfer, self.source_mac, self.dest_mac, self.route, self.hops + 1)
+
+def format_mac(value):
+    return ':'.join(f"{(value >> shift) & 255:02x}" for shift in range(40, -8, -8))
+
+class MACAllocator:
+    # Locally administered unicast MACs (02:00:00:xx:xx:xx) from a counter plus free list
+    def __init__(self, prefix=0x020000):
+        self.prefix = prefix
+        self._next = 1
+        self._free = []
+
+    def allocate(self):
+        if self._free:
+            value = self._free.pop()
+        elif self._next < 1 << 24:
+            value = self._next
+            self._next += 1
+        else:
+            raise ValueError("MAC address space is exhausted")
+        return format_mac((self.prefix << 24) | value)
+
+    def release(self, mac_address):
+        self._free.append(int(mac_address.replace(':', ''), 16) & 0xFFFFFF)
+
+class MACTable:
+    # Bounded MAC -> port table in LRU order; entries expire after aging_time of simulated time
+    def __init__(self, capacity=1024, aging_time=300.0):
+        self.capacity = capacity
+        self.aging_time = aging_time
+        self.entries = OrderedDict()  # mac -> (port, learned_at)
+        self.stats = {'hits': 0, 'misses': 0, 'floods': 0, 'evictions': 0, 'aged': 0}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def learn(self, mac_address, port, now):
+        entries = self.entries
+        if mac_address in entries:
+            entries.move_to_end(mac_address)
+        elif len(entries) >= self.capacity:
+            entries.popitem(last=False)
+            self.stats['evictions'] += 1
+        entries[mac_address] = (port, now)
+
+    def lookup(self, mac_address, now):
+        entry = self.entries.get(mac_address)
+        if entry is not None and now - entry[1] > self.aging_time:
+            del self.entries[mac_address]
+            self.stats['aged'] += 1
+            entry = None
+        if entry is None:
+            self.stats['misses'] += 1
+            return None
+        self.stats['hits'] += 1
+        return entry[0]
+
+    def remap_ports(self, mapping):
+        # mapping(port) returns the new port number, or None when the port went away
+        entries = OrderedDict()
+        for mac_address, (port, learned_at) in self.entries.items():
+            port = mapping(port)
+            if port is not None:
+                entries[mac_address] = (port, learned_at)
+        self.entries = entries
 
 class Device:
+    # Adjacency and routing state live in the owning Topology, indexed by self.index
+    __slots__ = ('device_id', 'index', 'topology', 'mac_address', 'ipv4_address', 'segment')
+
     def __init__(self, device_id):
         self.device_id = device_id
-        self.connected_devices = []
+        self.index = None
+        self.topology = None
         self.mac_address = None
         self.ipv4_address = None
-        self.routing_table = {}  # Initialize routing table
+        self.segment = None  # IPAM Segment the address was allocated from
+
+    @property
+    def connected_devices(self):
+        if self.topology is None:
+            return []
+        return [self.topology.device_at(i) for i in self.topology.neighbors(self.index)]
+
+    @property
+    def routing_table(self):
+        if self.topology is None:
+            return {}
+        return self.topology.routing_table(self)
 
     def connect(self, other_device):
-        if other_device not in self.connected_devices:
-            self.connected_devices.append(other_device)
-            other_device.connected_devices.append(self)
-            print(f"Devices {self.device_id} and {other_device.device_id} connected.")
-
-    def send_data(self, data, visited=None):
-        if visited is None:
-            visited = set()
-        visited.add(self.device_id)
-        print(f"Device {self.device_id} sending data: {data}")
-        for device in self.connected_devices:
-            if device.device_id not in visited:
-                device.receive_data(data, visited=visited)
-
-    def receive_data(self, data, visited=None):
-        if visited is None:
-            visited = set()
-        visited.add(self.device_id)
-        print(f"Device {self.device_id} received data: {data}")
-        self.send_data(data, visited=visited)
+        topology = self.topology or other_device.topology or Topology()
+        if topology.create_connection(self, other_device):
+            logger.debug("Devices %s and %s connected.", self.device_id, other_device.device_id)
+
+    def send_data(self, frame, topology):
+        frame.transfer.visited.add(self.index)
+        if frame.route is not None:
+            topology.transmit(frame, self.index, frame.route[frame.hops + 1])
+        else:
+            self.flood(frame, topology)
+
+    def receive_data(self, frame, from_index, topology):
+        transfer = frame.transfer
+        if self.index in transfer.visited:
+            return
+        transfer.visited.add(self.index)
+        if transfer.broadcast or transfer.receiver_index == self.index:
+            transfer.record_delivery(frame, topology.scheduler.now)
+            if not transfer.broadcast:
+                return
+        if frame.route is not None:
+            topology.transmit(frame, self.index, frame.route[frame.hops + 1])
+        else:
+            self.relay(frame, from_index, topology)
+
+    def relay(self, frame, from_index, topology):
+        pass  # End devices do not forward frames addressed to someone else
+
+    def flood(self, frame, topology, exclude=None):
+        visited = frame.transfer.visited
+        for neighbor in topology.neighbors(self.index):
+            if neighbor != exclude and neighbor not in visited:
+                topology.transmit(frame, self.index, neighbor)
 
     def generate_mac_address(self):
         if not self.mac_address:
-            self.mac_address = ':'.join(''.join(random.choices(string.hexdigits.lower(), k=2)) for _ in range(6))
+            if self.topology is None:
+                raise ValueError(f"Device {self.device_id} must be part of a topology to get a MAC address")
+            self.topology.assign_mac_address(self)
         return self.mac_address
 
     def assign_ipv4_address(self):
         if not self.ipv4_address:
-            self.ipv4_address = '.'.join(str(random.randint(0, 255)) for _ in range(4))
+            if self.topology is None:
+                raise ValueError(f"Device {self.device_id} must be part of a topology to get an IPv4 address")
+            self.topology.assign_ipv4_address(self)
         return self.ipv4_address
 
     def add_routing_entry(self, destination, next_hop):
-        self.routing_table[destination] = next_hop
+        self.topology.add_routing_entry(self, destination, next_hop)
 
 class Hub(Device):
+    __slots__ = ()
+
     def __init__(self, hub_id):
         super().__init__(hub_id)
 
-    def broadcast(self, data, visited=None):
-        if visited is None:
-            visited = set()
-        visited.add(self.device_id)
-        print(f"Hub {self.device_id} broadcasting data: {data}")
-        for device in self.connected_devices:
-            if device.device_id not in visited:
-                device.receive_data(data, visited=visited)
-
-    def receive_data(self, data, visited=None):
-        if visited is None:
-            visited = set()
-        visited.add(self.device_id)
-        print(f"Hub {self.device_id} received data: {data}")
-        self.broadcast(data, visited=visited)
+    def broadcast(self, frame, topology, exclude=None):
+        self.flood(frame, topology, exclude)
+
+    def relay(self, frame, from_index, topology):
+        self.broadcast(frame, topology, exclude=from_index)
 
 class Switch(Device):
-    def __init__(self, switch_id):
+    __slots__ = ('mac_table',)
+
+    def __init__(self, switch_id, mac_table_size=1024, aging_time=300.0):
         super().__init__(switch_id)
-        self.mac_table = {}
-
-    def receive_data(self, data, visited=None):
-        if visited is None:
-            visited = set()
-        visited.add(self.device_id)
-        print(f"Switch {self.device_id} received data: {data}")
-        self.mac_table[data['source_mac']] = data['source_mac']
-        dest_mac = data['dest_mac']
-        if dest_mac in self.mac_table:
-            for device in self.connected_devices:
-                if device.generate_mac_address() == dest_mac:
-                    device.receive_data(data, visited)
-                    break
-        else:
-            for device in self.connected_devices:
-                if device.generate_mac_address() != data['source_mac']:
-                    device.receive_data(data, visited)
+        self.mac_table = MACTable(mac_table_size, aging_time)
+
+    def relay(self, frame, from_index, topology):
+        # Ports are neighbor indices: learn the ingress port, forward on a hit, flood on a miss
+        table = self.mac_table
+        now = topology.scheduler.now
+        table.learn(frame.source_mac, from_index, now)
+        if frame.dest_mac != BROADCAST_MAC:
+            port = table.lookup(frame.dest_mac, now)
+            if port == from_index:
+                return  # Destination sits behind the ingress port, so filter the frame
+            if port is not None:
+                topology.transmit(frame, self.index, port)
+                return
+        table.stats['floods'] += 1
+        self.flood(frame, topology, exclude=from_index)
 
 class Repeater(Device):
+    __slots__ = ()
+
     def __init__(self, repeater_id):
         super().__init__(repeater_id)
 
-    def send_data(self, data, receiver_mac):
-        for device in self.connected_devices:
-            if device.mac_address == receiver_mac:
-                device.receive_data(data)
-                print(f"Repeater {self.device_id} forwarded data to {device.mac_address}")
-                return
-        print(f"Receiver device with MAC address {receiver_mac} not connected to repeater {self.device_id}")
+    def relay(self, frame, from_index, topology):
+        destination = topology.mac_addresses.get(frame.dest_mac)
+        if destination is not None and destination.index in topology.neighbors(self.index):
+            topology.transmit(frame, self.index, destination.index)
+            return
+        self.flood(frame, topology, exclude=from_index)
+
+def format_ipv4(value):
+    return f"{value >> 24}.{(value >> 16) & 255}.{(value >> 8) & 255}.{value & 255}"
+
+def parse_ipv4(address):
+    return int(ipaddress.IPv4Address(address))
+
+def parse_prefix(prefix):
+    network = ipaddress.IPv4Network(prefix, strict=False)
+    return int(network.network_address), network.prefixlen
+
+class PrefixTrie:
+    # Binary trie over IPv4 prefixes; lookup returns the longest matching (prefix_length, value)
+    def __init__(self):
+        self.root = [None, None, None]  # Child for bit 0, child for bit 1, (prefix_length, value)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def insert(self, network, prefix_length, value):
+        node = self.root
+        for bit in range(prefix_length):
+            branch = (network >> (31 - bit)) & 1
+            if node[branch] is None:
+                node[branch] = [None, None, None]
+            node = node[branch]
+        if node[2] is None:
+            self.size += 1
+        node[2] = (prefix_length, value)
+
+    def lookup(self, address):
+        node = self.root
+        best = node[2]
+        for bit in range(32):
+            node = node[(address >> (31 - bit)) & 1]
+            if node is None:
+                break
+            if node[2] is not None:
+                best = node[2]
+        return best
+
+    def items(self):
+        stack = [(self.root, 0, 0)]
+        while stack:
+            node, network, depth = stack.pop()
+            if node[2] is not None:
+                yield network, node[2][0], node[2][1]
+            for branch in (1, 0):
+                if node[branch] is not None:
+                    stack.append((node[branch], network | (branch << (31 - depth)), depth + 1))
+
+class Segment:
+    # One subnet handed out by the IPAM; host offsets come from a counter plus a free list
+    def __init__(self, segment_id, name, network, prefix_length, anchor=None):
+        self.segment_id = segment_id
+        self.name = name
+        self.network = network
+        self.prefix_length = prefix_length
+        self.anchor = anchor  # Hub or Switch the segment hangs off, None for a plain L1 network
+        self.size = 1 << (32 - prefix_length)
+        self.allocated = set()
+        self._next = 1  # Offset 0 is the network address, size - 1 the broadcast address
+        self._free = []
+
+    @property
+    def cidr(self):
+        return f"{format_ipv4(self.network)}/{self.prefix_length}"
+
+    def __contains__(self, value):
+        return self.network <= value < self.network + self.size
+
+    @property
+    def available(self):
+        return len(self._free) + self.size - 1 - self._next
+
+    def allocate_many(self, count):
+        reused = self._free[len(self._free) - count:] if count else []
+        fresh = count - len(reused)
+        if self._next + fresh > self.size - 1:
+            raise ValueError(f"Subnet {self.cidr} is exhausted")
+        del self._free[len(self._free) - len(reused):]
+        offsets = reused + list(range(self._next, self._next + fresh))
+        self._next += fresh
+        self.allocated.update(offsets)
+        return [self.network + offset for offset in offsets]
+
+    def allocate(self):
+        return self.allocate_many(1)[0]
+
+    def release(self, value):
+        offset = value - self.network
+        if offset not in self.allocated:
+            raise ValueError(f"{format_ipv4(value)} is not allocated in {self.cidr}")
+        self.allocated.remove(offset)
+        self._free.append(offset)
+
+class IPAddressManager:
+    # Carves aligned per-segment subnets out of one pool and allocates unique host addresses
+    def __init__(self, pool='10.0.0.0/8', default_prefix=24):
+        network, prefix_length = parse_prefix(pool)
+        self.pool = (network, network + (1 << (32 - prefix_length)))
+        self.default_prefix = default_prefix
+        self.segments = []
+        self.prefixes = PrefixTrie()  # Segment network -> segment_id
+        self._cursor = network
+
+    def add_segment(self, name, hosts=0, prefix_length=None, anchor=None):
+        if prefix_length is None:
+            # Room for the hosts plus network and broadcast addresses, never smaller than the default
+            prefix_length = min(self.default_prefix, 32 - max(2, (hosts + 1).bit_length()))
+        size = 1 << (32 - prefix_length)
+        network = -(-self._cursor // size) * size
+        if network + size > self.pool[1]:
+            raise ValueError(f"Address pool {format_ipv4(self.pool[0])} is exhausted")
+        self._cursor = network + size
+        segment = Segment(len(self.segments), name, network, prefix_length, anchor)
+        self.segments.append(segment)
+        self.prefixes.insert(network, prefix_length, segment.segment_id)
+        return segment
+
+    def segment_for(self, address):
+        match = self.prefixes.lookup(parse_ipv4(address) if isinstance(address, str) else address)
+        return self.segments[match[1]] if match is not None else None
+
+    def allocate(self, segment):
+        return format_ipv4(segment.allocate())
+
+    def allocate_many(self, segment, count):
+        return [format_ipv4(value) for value in segment.allocate_many(count)]
+
+    def release(self, address):
+        value = parse_ipv4(address)
+        segment = self.segment_for(value)
+        if segment is None:
+            raise ValueError(f"{address} does not belong to any segment")
+        segment.release(value)
+
+    def release_many(self, addresses):
+        for address in addresses:
+            self.release(address)
+
+def breadth_first_search(indptr, indices, destinations):
+    # Next-hop and hop-count rows toward each destination over a CSR adjacency, one BFS wave
+    # per hop for every destination in the batch at once. Where several frontier devices reach
+    # the same device, the lowest-indexed one becomes its next hop.
+    n = len(indptr) - 1
+    rows = np.arange(len(destinations))
+    targets = np.asarray(destinations, dtype=np.int64)
+    next_hop = np.full((len(targets), n), -1, dtype=np.int32)
+    distance = np.full((len(targets), n), -1, dtype=np.int32)
+    next_hop[rows, targets] = targets
+    distance[rows, targets] = 0
+    frontier_rows, frontier_nodes = rows, targets
+    hops, hop_counts = next_hop.reshape(-1), distance.reshape(-1)  # Flat views, indexed by row * n + device
+    level = 0
+    while frontier_nodes.size:
+        level += 1
+        starts = indptr[frontier_nodes]
+        counts = indptr[frontier_nodes + 1] - starts
+        total = int(counts.sum())
+        if not total:
+            break
+        owner = np.repeat(np.arange(frontier_nodes.size), counts)
+        offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts) + starts[owner]
+        edge_rows, neighbors = frontier_rows[owner], indices[offsets]
+        cells = edge_rows * n + neighbors
+        fresh = hop_counts[cells] < 0
+        edge_rows, neighbors, cells = edge_rows[fresh], neighbors[fresh], cells[fresh]
+        via = frontier_nodes[owner][fresh].astype(np.int32)
+        # Several frontier devices may reach the same device. Any one of the writes may land, so
+        # cells that lost a write take the minimum over the losers too, and the edge that
+        # supplied the minimum is kept
+        hops[cells] = via
+        lost = hops[cells] != via
+        if lost.any():
+            np.minimum.at(hops, cells[lost], via[lost])
+        won = hops[cells] == via
+        frontier_rows, frontier_nodes = edge_rows[won], neighbors[won]
+        hop_counts[cells[won]] = level
+    return next_hop, distance
+
+class RoutingPlane:
+    # Next-hop and hop-count rows per destination, filled by batched breadth-first searches over
+    # a CSR copy of the topology adjacency and patched incrementally when links or devices change
+    batch_cells = 1 << 22  # Upper bound on destinations x (devices or edges) searched in one batch
+
+    def __init__(self, topology):
+        self.topology = topology
+        self.next_hop = {}  # destination -> int32 array, next hop of every source (-1 unreachable)
+        self.distance = {}  # destination -> int32 array, hop count of every source (-1 unreachable)
+        self._csr = None
+
+    def __len__(self):
+        return len(self.next_hop)
+
+    def csr(self):
+        if self._csr is None:
+            self._csr = self.topology.adjacency_csr()
+        return self._csr
+
+    def search(self, destinations):
+        return breadth_first_search(*self.csr(), destinations)
+
+    def compute(self, destinations):
+        destinations = list(destinations)
+        indptr, _ = self.csr()
+        batch = max(1, self.batch_cells // max(len(indptr), int(indptr[-1])))  # Bounded by devices or edges
+        for start in range(0, len(destinations), batch):
+            chunk = destinations[start:start + batch]
+            next_hop, distance = self.search(chunk)
+            for row, destination in enumerate(chunk):
+                self.next_hop[destination] = next_hop[row]
+                self.distance[destination] = distance[row]
+
+    def build(self):
+        self.compute(i for i in range(len(self.topology)) if i not in self.next_hop)
+
+    def row(self, destination):
+        if destination not in self.next_hop:
+            self.compute([destination])
+        return self.next_hop[destination]
+
+    def path(self, source, target):
+        hops = self.row(target)
+        if hops[source] < 0:
+            return None
+        path = [source]
+        while path[-1] != target:
+            path.append(int(hops[path[-1]]))
+        return path
+
+    def link_added(self, i, j):
+        # Shortest paths to a destination only change if the new link shortcuts them
+        self._csr = None
+        stale = [destination for destination, distance in self.distance.items()
+                 if (distance[i] < 0) != (distance[j] < 0) or abs(int(distance[i]) - int(distance[j])) > 1]
+        self.compute(stale)
+
+    def link_removed(self, i, j):
+        # Only destinations whose trees used the link in either direction need a new search
+        self._csr = None
+        stale = [destination for destination, hops in self.next_hop.items() if hops[i] == j or hops[j] == i]
+        self.compute(stale)
+
+    def devices_added(self, count):
+        # New devices are unreachable until linked; link_added picks them up from there
+        self._csr = None
+        padding = np.full(count, -1, dtype=np.int32)
+        for destination in self.next_hop:
+            self.next_hop[destination] = np.concatenate((self.next_hop[destination], padding))
+            self.distance[destination] = np.concatenate((self.distance[destination], padding))
+
+    def dependents(self, index):
+        # Destinations whose next-hop trees pass through the device at index
+        return [destination for destination, hops in self.next_hop.items()
+                if destination != index and np.count_nonzero(hops == index) > (hops[index] == index)]
+
+    def device_removed(self, index, stale):
+        self._csr = None
+        self.next_hop.pop(index, None)
+        self.distance.pop(index, None)
+        shift = lambda i: i - 1 if i > index else i
+        next_hop, distance = {}, {}
+        for destination, hops in self.next_hop.items():
+            hops = np.delete(hops, index)
+            hops[hops > index] -= 1
+            next_hop[shift(destination)] = hops
+            distance[shift(destination)] = np.delete(self.distance[destination], index)
+        self.next_hop, self.distance = next_hop, distance
+        self.compute(shift(destination) for destination in stale)
+
+def endpoint_indices(topology):
+    # Plain devices (hosts and the router), the ones that source and sink traffic
+    return np.array([device.index for device in topology.devices if type(device) is Device], dtype=np.int64)
+
+class TrafficMatrix:
+    # Flows as parallel arrays of source index, destination index and volume (bytes per second).
+    # Generated matrices are either every ordered endpoint pair or num_flows sampled pairs
+    def __init__(self, sources, destinations, volumes):
+        self.sources = np.asarray(sources, dtype=np.int64)
+        self.destinations = np.asarray(destinations, dtype=np.int64)
+        self.volumes = np.asarray(volumes, dtype=np.float64)
+        if not np.isfinite(self.volumes).all() or (self.volumes < 0).any():
+            raise ValueError("Flow volumes must be finite and non-negative")
+
+    def __len__(self):
+        return len(self.sources)
+
+    @property
+    def total(self):
+        return float(self.volumes.sum())
+
+    @staticmethod
+    def pairs(endpoints, num_flows, rng, weights=None):
+        m = len(endpoints)
+        if m < 2:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        if num_flows is None:
+            sources, destinations = np.divmod(np.arange(m * m), m)
+            keep = sources != destinations
+            return endpoints[sources[keep]], endpoints[destinations[keep]]
+        if weights is None:
+            sources = rng.integers(0, m, num_flows)
+            destinations = (sources + rng.integers(1, m, num_flows)) % m  # Never the source itself
+            return endpoints[sources], endpoints[destinations]
+        sources = rng.choice(m, num_flows, p=weights)
+        destinations = rng.choice(m, num_flows, p=weights)
+        clash = np.flatnonzero(sources == destinations)
+        while clash.size:
+            destinations[clash] = rng.choice(m, clash.size, p=weights)
+            clash = clash[sources[clash] == destinations[clash]]
+        return endpoints[sources], endpoints[destinations]
+
+    @classmethod
+    def uniform(cls, topology, num_flows=None, volume=1000.0, seed=None):
+        sources, destinations = cls.pairs(endpoint_indices(topology), num_flows, np.random.default_rng(seed))
+        return cls(sources, destinations, np.full(len(sources), volume))
+
+    @classmethod
+    def hotspot(cls, topology, num_flows=None, volume=1000.0, hotspots=1, fraction=0.5, seed=None):
+        # A fraction of the flows is redirected to a few hotspot endpoints (servers, a gateway)
+        rng = np.random.default_rng(seed)
+        endpoints = endpoint_indices(topology)
+        sources, destinations = cls.pairs(endpoints, num_flows, rng)
+        targets = rng.choice(endpoints, min(hotspots, len(endpoints)), replace=False) if len(endpoints) else endpoints
+        redirect = np.flatnonzero(rng.random(len(sources)) < fraction)
+        destinations[redirect] = rng.choice(targets, redirect.size)
+        keep = sources != destinations
+        return cls(sources[keep], destinations[keep], np.full(int(keep.sum()), volume))
+
+    @classmethod
+    def gravity(cls, topology, num_flows=None, total=1e6, seed=None):
+        # Demand between i and j proportional to weight_i * weight_j, with exponential weights
+        rng = np.random.default_rng(seed)
+        endpoints = endpoint_indices(topology)
+        weights = rng.exponential(1.0, len(endpoints))
+        weights /= weights.sum()
+        if num_flows is None:
+            sources, destinations = cls.pairs(endpoints, None, rng)
+            position = np.zeros(len(topology), dtype=np.int64)
+            position[endpoints] = np.arange(len(endpoints))
+            volumes = weights[position[sources]] * weights[position[destinations]]
+        else:
+            sources, destinations = cls.pairs(endpoints, num_flows, rng, weights)
+            volumes = np.ones(len(sources))
+        return cls(sources, destinations, volumes * total / max(volumes.sum(), 1e-300))
+
+    @classmethod
+    def from_flows(cls, topology, flows):
+        # Caller-supplied (sender_id, receiver_id, volume) tuples
+        flows = list(flows)
+        for sender_id, receiver_id, _ in flows:
+            if sender_id not in topology or receiver_id not in topology:
+                raise ValueError(f"Unknown device in flow {sender_id} -> {receiver_id}")
+        return cls([topology.index_of(flow[0]) for flow in flows], [topology.index_of(flow[1]) for flow in flows],
+                   [float(flow[2]) for flow in flows])
+
+def tree_roots(indptr, indices, destinations):
+    # The device whose shortest-path tree a flow follows: a single-homed destination's neighbor
+    roots = destinations.copy()
+    leaf = np.flatnonzero(np.diff(indptr)[destinations] == 1)
+    roots[leaf] = indices[indptr[destinations[leaf]]]
+    return roots
+
+def tree_loads(indptr, indices, destinations, sources, volumes, batch_cells=1 << 22):
+    # Routes every flow down the shortest-path tree of its destination. A tree's link loads are
+    # its subtree sums, found by pointer jumping: O(log depth) bincounts over all trees of a batch.
+    # Flows to a single-homed device share the tree of its attachment point plus one last hop, so
+    # a star needs one tree rather than one per host.
+    # Returns per-directed-edge load (aligned with indices), per-device load and dropped volume
+    n = len(indptr) - 1
+    width = n + 1  # One spare slot per tree collects volume that leaves through the root
+    degrees = np.diff(indptr)
+    keys = np.repeat(np.arange(n, dtype=np.int64), degrees) * n + indices
+    edge_load = np.zeros(len(indices))
+    device_load = np.zeros(n)
+    dropped = 0.0
+    local = sources == destinations
+    device_load += np.bincount(destinations[local], weights=volumes[local], minlength=n)
+    sources, destinations, volumes = sources[~local], destinations[~local], volumes[~local]
+    roots = tree_roots(indptr, indices, destinations)
+    targets, flow_rows = np.unique(roots, return_inverse=True)
+    batch = max(1, batch_cells // max(width, len(indices)))  # Bounded by devices or edges, as in RoutingPlane
+    for start in range(0, len(targets), batch):
+        chunk = targets[start:start + batch]
+        rows = len(chunk)
+        selected = np.flatnonzero((flow_rows >= start) & (flow_rows < start + rows))
+        flow_row, flow_source, flow_volume = flow_rows[selected] - start, sources[selected], volumes[selected]
+        next_hop, distance = breadth_first_search(indptr, indices, chunk)
+        reachable = distance[flow_row, flow_source] >= 0
+        dropped += float(flow_volume[~reachable].sum())
+        last_hop = np.flatnonzero(reachable & (roots[selected] != destinations[selected]))
+        hop_from, hop_to = roots[selected][last_hop], destinations[selected][last_hop]
+        edge_load += np.bincount(np.searchsorted(keys, hop_from * n + hop_to), weights=flow_volume[last_hop], minlength=len(indices))
+        device_load += np.bincount(hop_to, weights=flow_volume[last_hop], minlength=n)
+        base = np.arange(rows, dtype=np.int64)[:, None] * width
+        parent = np.empty((rows, width), dtype=np.int64)
+        parent[:, :n] = np.where(next_hop < 0, n, next_hop)
+        parent[np.arange(rows), chunk] = n
+        parent[:, n] = n
+        jump = (parent + base).ravel()
+        load = np.bincount(base[flow_row[reachable], 0] + flow_source[reachable], weights=flow_volume[reachable], minlength=rows * width)
+        span = 1
+        while span <= distance.max():
+            load = load + np.bincount(jump, weights=load, minlength=rows * width)
+            jump = jump[jump]
+            span *= 2
+        load = load.reshape(rows, width)[:, :n]
+        device_load += load.sum(axis=0)
+        tree_rows, children = np.nonzero((load > 0) & (parent[:, :n] < n))
+        positions = np.searchsorted(keys, children * n + parent[tree_rows, children])
+        edge_load += np.bincount(positions, weights=load[tree_rows, children], minlength=len(indices))
+    return edge_load, device_load, dropped
+
+_load_pool = None
+_load_pool_lock = threading.Lock()
+
+def load_pool():
+    # Shared worker processes for load runs, spawned once; spawn avoids forking the server's threads
+    global _load_pool
+    with _load_pool_lock:
+        if _load_pool is None:
+            _load_pool = ProcessPoolExecutor(max_workers=os.cpu_count() or 1, mp_context=multiprocessing.get_context('spawn'))
+        return _load_pool
 
 class Topology:
     def __init__(self):
-        self.devices = []
-        self.graph = nx.Graph()
+        self.devices = []  # Device objects, position == device.index
+        self.device_index = {}  # device_id -> index
+        self.adjacency = []  # Set of neighbor indices per device
+        self.links = {}  # (low index, high index) -> Link, created on first use
+        self.link_settings = {}  # Non-default (latency, bandwidth) per link
+        self.routing_tables = {}  # index -> PrefixTrie of static routes
+        self.ipam = IPAddressManager()
+        self.anchor_segments = {}  # Anchor device_id (None for the plain L1 segment) -> [Segment]
+        self.addresses = {}  # IPv4 address -> Device
+        self.macs = MACAllocator()
+        self.mac_addresses = {}  # MAC address -> Device
+        self.segment_routes = None  # devices x segments next-hop indices, CONNECTED or UNREACHABLE
+        self.scheduler = EventScheduler()
+        self.kind = None  # 'star', 'bus', 'ring' or 'mesh' while the builder's index layout holds
+        self._graph = None
+        self._routing = None
+
+    def __len__(self):
+        return len(self.devices)
+
+    def __contains__(self, device_id):
+        return device_id in self.device_index
+
+    def get_device(self, device_id):
+        return self.devices[self.device_index[device_id]]
+
+    def index_of(self, device_id):
+        return self.device_index.get(device_id)
+
+    def device_at(self, index):
+        return self.devices[index]
+
+    def neighbors(self, index):
+        return self.adjacency[index]
 
     def add_device(self, device):
+        if device.topology is self:
+            return device.index
+        if device.device_id in self.device_index:
+            raise ValueError(f"Duplicate device ID {device.device_id}")
+        device.index = len(self.devices)
+        device.topology = self
         self.devices.append(device)
-        self.graph.add_node(device.device_id)
+        self.device_index[device.device_id] = device.index
+        self.adjacency.append(set())
+        self.kind = None
+        self._graph = None
+        self.segment_routes = None
+        if self._routing is not None:
+            self._routing.devices_added(1)
+        return device.index
+
+    def add_devices(self, devices):
+        devices = [device for device in devices if device.topology is not self]
+        for index, device in enumerate(devices, len(self.devices)):
+            if device.device_id in self.device_index:
+                raise ValueError(f"Duplicate device ID {device.device_id}")
+            device.index = index
+            device.topology = self
+            self.device_index[device.device_id] = index
+        self.devices.extend(devices)
+        self.adjacency.extend(set() for _ in devices)
+        self.kind = None
+        self._graph = None
+        self.segment_routes = None
+        if self._routing is not None and devices:
+            self._routing.devices_added(len(devices))
+
+    def link(self, i, j):
+        if i == j or j in self.adjacency[i]:
+            return False
+        self.adjacency[i].add(j)
+        self.adjacency[j].add(i)
+        self._graph = None
+        self.segment_routes = None
+        if self._routing is not None:
+            self._routing.link_added(i, j)
+        return True
+
+    def unlink(self, i, j):
+        if j not in self.adjacency[i]:
+            return False
+        self.adjacency[i].discard(j)
+        self.adjacency[j].discard(i)
+        self.links.pop(self.link_key(i, j), None)
+        self.link_settings.pop(self.link_key(i, j), None)
+        for switch, port in ((self.devices[i], j), (self.devices[j], i)):
+            if isinstance(switch, Switch):
+                switch.mac_table.remap_ports(lambda learned: None if learned == port else learned)
+        self._graph = None
+        self.segment_routes = None
+        if self._routing is not None:
+            self._routing.link_removed(i, j)
+        return True
+
+    def remove_connection(self, device1, device2):
+        return self.unlink(device1.index, device2.index)
+
+    def remove_device(self, device):
+        index = device.index
+        stale = self._routing.dependents(index) if self._routing is not None else []
+        shift = lambda i: i - 1 if i > index else i
+        for neighbor in self.adjacency[index]:
+            self.adjacency[neighbor].discard(index)
+        del self.adjacency[index]
+        del self.devices[index]
+        del self.device_index[device.device_id]
+        self.adjacency = [{shift(j) for j in neighbors} for neighbors in self.adjacency]
+        for other in self.devices[index:]:
+            other.index -= 1
+            self.device_index[other.device_id] = other.index
+        self.links = {(shift(i), shift(j)): link for (i, j), link in self.links.items() if index not in (i, j)}
+        self.link_settings = {(shift(i), shift(j)): settings for (i, j), settings in self.link_settings.items() if index not in (i, j)}
+        self.routing_tables = {shift(i): table for i, table in self.routing_tables.items() if i != index}
+        if device.ipv4_address:
+            self.ipam.release(device.ipv4_address)
+            del self.addresses[device.ipv4_address]
+            device.ipv4_address = None
+            device.segment = None
+        if device.mac_address:
+            self.macs.release(device.mac_address)
+            del self.mac_addresses[device.mac_address]
+            device.mac_address = None
+        for other in self.devices:
+            if isinstance(other, Switch):
+                other.mac_table.remap_ports(lambda port: None if port == index else shift(port))
+        device.index = None
+        device.topology = None
+        self.kind = None
+        self._graph = None
+        self.segment_routes = None
+        if self._routing is not None:
+            self._routing.device_removed(index, stale)
+
+    def create_connection(self, device1, device2, latency=None, bandwidth=None):
+        if not self.link(self.add_device(device1), self.add_device(device2)):
+            return False
+        i, j = device1.index, device2.index
+        if latency is not None or bandwidth is not None:
+            self.link_settings[self.link_key(i, j)] = (latency, bandwidth)
+        return True
+
+    @staticmethod
+    def link_key(i, j):
+        return (i, j) if i < j else (j, i)
 
-    def create_connection(self, device1, device2):
-        device1.connect(device2)
-        self.graph.add_edge(device1.device_id, device2.device_id)
+    def get_link(self, i, j):
+        key = self.link_key(i, j)
+        link = self.links.get(key)
+        if link is None:
+            link = Link()
+            latency, bandwidth = self.link_settings.get(key, (None, None))
+            if latency is not None:
+                link.latency = latency
+            if bandwidth is not None:
+                link.bandwidth = bandwidth
+            self.links[key] = link
+        return link
+
+    @property
+    def graph(self):
+        # NetworkX view of the adjacency, only built when a caller needs it (e.g. plotting)
+        if self._graph is None:
+            graph = nx.Graph()
+            graph.add_nodes_from(device.device_id for device in self.devices)
+            devices = self.devices
+            graph.add_edges_from((devices[i].device_id, devices[j].device_id)
+                                 for i, neighbors in enumerate(self.adjacency) for j in neighbors if i < j)
+            self._graph = graph
+        return self._graph
+
+    @property
+    def routing(self):
+        if self._routing is None:
+            self._routing = RoutingPlane(self)
+        return self._routing
+
+    def adjacency_csr(self):
+        # (indptr, indices) with every device's neighbors sorted, as breadth_first_search expects
+        adjacency = self.adjacency
+        degrees = np.fromiter(map(len, adjacency), dtype=np.int64, count=len(adjacency))
+        indptr = np.zeros(len(adjacency) + 1, dtype=np.int64)
+        np.cumsum(degrees, out=indptr[1:])
+        indices = np.fromiter(itertools.chain.from_iterable(sorted(neighbors) for neighbors in adjacency),
+                              dtype=np.int64, count=int(indptr[-1]))
+        return indptr, indices
+
+    def shortest_path(self, source, target):
+        # Follows next-hop pointers; returns device indices or None
+        return self.routing.path(source, target)
+
+    def shortest_paths(self, pairs):
+        # shortest_path for many (source, target) pairs; missing destination rows come from one batched search
+        pairs = list(pairs)
+        routing = self.routing
+        routing.compute({target for _, target in pairs if target not in routing.next_hop})
+        return [routing.path(source, target) for source, target in pairs]
+
+    def traffic_load(self, matrix, workers=None, parallel_cells=1 << 26):
+        # Per-directed-edge load (aligned with routing.csr()), per-device load and undeliverable volume.
+        # Big runs are split by routing tree across the process pool, each part with its own flows
+        indptr, indices = self.routing.csr()
+        roots = tree_roots(indptr, indices, matrix.destinations)
+        targets = np.unique(roots)
+        workers = workers or os.cpu_count() or 1
+        if workers == 1 or len(targets) * (len(indptr) + int(indptr[-1])) < parallel_cells:
+            return tree_loads(indptr, indices, matrix.destinations, matrix.sources, matrix.volumes)
+        parts = []
+        for group in np.array_split(targets, workers):
+            selected = np.isin(roots, group)
+            parts.append(load_pool().submit(tree_loads, indptr, indices, matrix.destinations[selected],
+                                            matrix.sources[selected], matrix.volumes[selected]))
+        edge_load, device_load, dropped = parts[0].result()
+        for part in parts[1:]:
+            edges, devices, lost = part.result()
+            edge_load += edges
+            device_load += devices
+            dropped += lost
+        return edge_load, device_load, dropped
+
+    def transmit(self, frame, sender, receiver):
+        link = self.get_link(sender, receiver)
+        frame.transfer.frames_generated += 1
+        now = self.scheduler.now
+        arrival = link.arrival_time(now, sender, frame.size)
+        self.scheduler.schedule(arrival - now, self.device_at(receiver).receive_data, frame.next_hop(), sender, self)
+
+    def start_transfer(self, sender, receiver, message, route=None):
+        transfer = Transfer(sender, receiver, message, self.scheduler.now)
+        dest_mac = receiver.generate_mac_address() if receiver is not None else BROADCAST_MAC
+        sender.send_data(Frame(transfer, sender.generate_mac_address(), dest_mac, route), self)
+        return transfer
 
     def create_star_topology(self, devices, hub):
-        self.add_device(hub)
+        kind = 'star' if not self.devices else None
+        self.add_devices([hub, *devices])
         for device in devices:
-            self.add_device(device)
-            self.create_connection(device, hub)
+            self.link(device.index, hub.index)
+        self.kind = kind
 
     def create_bus_topology(self, devices, repeaters):
-        self.add_device(repeaters[0])
-        self.create_connection(repeaters[0], devices[0])
-        self.add_device(devices[0])
-        for i in range(1, len(repeaters)):
-            self.add_device(repeaters[i])
-            self.create_connection(repeaters[i], repeaters[i-1])
-            self.create_connection(repeaters[i], devices[i])
-            self.add_device(devices[i])
+        kind = 'bus' if not self.devices else None
+        self.add_devices([device for pair in zip(repeaters, devices) for device in pair])
+        for i in range(len(repeaters)):
+            self.link(repeaters[i].index, devices[i].index)
+            if i:
+                self.link(repeaters[i].index, repeaters[i-1].index)
+        self.kind = kind
 
     def create_ring_topology(self, devices, repeaters):
-        for device, repeater in zip(devices, repeaters):
-            self.add_device(repeater)
-            self.add_device(device)
-            self.create_connection(device, repeater)
+        kind = 'ring' if not self.devices else None
+        self.add_devices([device for pair in zip(repeaters, devices) for device in pair])
         for i in range(len(repeaters)):
-            self.create_connection(repeaters[i], repeaters[(i + 1) % len(repeaters)])
+            self.link(devices[i].index, repeaters[i].index)
+            self.link(repeaters[i].index, repeaters[(i + 1) % len(repeaters)].index)
+        self.kind = kind
 
     def create_mesh_topology(self, devices, repeaters):
+        kind = 'mesh' if not self.devices else None
+        self.add_devices([device for pair in zip(repeaters, devices) for device in pair])
         for device, repeater in zip(devices, repeaters):
-            self.add_device(repeater)
-            self.add_device(device)
-            self.create_connection(device, repeater)
-            for other_repeater in repeaters:
-                if other_repeater != repeater:
-                    self.create_connection(repeater, other_repeater)
-
-    def plot_topology(self):
-        pos = nx.spring_layout(self.graph)
-        nx.draw(self.graph, pos, with_labels=True, node_size=800, node_color='skyblue', font_size=10, font_weight='bold')
-        plt.title('Network Topology')
-        plt.savefig('static/topology.png')
-        plt.close()
+            self.link(device.index, repeater.index)
+        indices = [repeater.index for repeater in repeaters]
+        for i in indices:
+            self.adjacency[i].update(j for j in indices if j != i)
+        self._graph = None
+        self._routing = None  # Bulk edit bypasses link(), so routes are rebuilt from scratch
+        self.kind = kind
+
+    def edge_count(self):
+        return sum(map(len, self.adjacency)) // 2
+
+    def edge_array(self):
+        edges = [(i, j) for i, neighbors in enumerate(self.adjacency) for j in neighbors if i < j]
+        return np.array(edges, dtype=np.int64).reshape(-1, 2)
+
+    def layout(self):
+        return topology_renderer.layout(self)
+
+    def plot_topology(self, pos=None, fmt='png', path=None):
+        image = topology_renderer.render(self, pos, fmt)
+        if path is not None:
+            with open(path, 'wb') as plot_file:
+                plot_file.write(image)
+        return image
+
+    def estimated_bytes(self):
+        # Rough footprint for cache accounting: device objects, neighbor sets, routing rows
+        size = 450 * len(self) + 80 * sum(map(len, self.adjacency))
+        if self._routing is not None:
+            size += sum(row.nbytes for row in self._routing.next_hop.values()) * 2
+        if self.segment_routes is not None:
+            size += self.segment_routes.nbytes
+        return size
+
+    def segment_anchor(self, device):
+        # Hubs and switches head their own segment, hosts join an adjacent hub (or else switch),
+        # and repeaters or hosts without one share the plain L1 segment
+        if isinstance(device, (Hub, Switch)):
+            return device
+        if isinstance(device, Repeater):
+            return None
+        switch = None
+        for neighbor in self.neighbors(device.index):
+            other = self.device_at(neighbor)
+            if isinstance(other, Hub):
+                return other
+            if switch is None and isinstance(other, Switch):
+                switch = other
+        return switch
+
+    def allocate_for_anchor(self, anchor, count):
+        # Fill the anchor's segments in order; once they are full, chain a new prefix sized for
+        # the rest and at least twice the last one (the first is sized from the anchor's degree)
+        key = anchor.device_id if anchor is not None else None
+        chain = self.anchor_segments.setdefault(key, [])
+        allocated = []
+        for segment in chain:
+            take = min(count - len(allocated), segment.available)
+            if take:
+                allocated.extend((address, segment) for address in self.ipam.allocate_many(segment, take))
+        while len(allocated) < count:
+            hosts = count - len(allocated)
+            if chain:
+                hosts = max(hosts, 2 * chain[-1].size - 2)
+            elif anchor is not None:
+                hosts = max(hosts, len(self.neighbors(anchor.index)))
+            segment = self.ipam.add_segment(key or 'lan', hosts, anchor=anchor)
+            chain.append(segment)
+            take = min(count - len(allocated), segment.available)
+            allocated.extend((address, segment) for address in self.ipam.allocate_many(segment, take))
+        return allocated
+
+    def assign_mac_address(self, device):
+        device.mac_address = self.macs.allocate()
+        self.mac_addresses[device.mac_address] = device
+
+    def assign_ipv4_address(self, device):
+        [(address, segment)] = self.allocate_for_anchor(self.segment_anchor(device), 1)
+        device.ipv4_address = address
+        device.segment = segment
+        self.addresses[address] = device
+        self.segment_routes = None
 
     def assign_ipv4_addresses(self):
+        groups = {}
         for device in self.devices:
-            device.assign_ipv4_address()
+            if not device.ipv4_address:
+                groups.setdefault(self.segment_anchor(device), []).append(device)
+        for anchor, members in groups.items():
+            for device, (address, segment) in zip(members, self.allocate_for_anchor(anchor, len(members))):
+                device.ipv4_address = address
+                device.segment = segment
+                self.addresses[address] = device
+        self.segment_routes = None
+
+    def device_by_address(self, address):
+        return self.addresses.get(address)
 
     def calculate_broadcast_domains(self):
         broadcast_domains = 1  # Single switch creates one broadcast domain
         return broadcast_domains
 
     def calculate_collision_domains(self):
-        return len([device for device in self.devices if isinstance(device, Hub)])
+        return sum(1 for device in self.devices if isinstance(device, Hub))
+
+    def add_routing_entry(self, device, destination, next_hop):
+        # Static route; destination is a host address or a CIDR prefix
+        network, prefix_length = parse_prefix(destination)
+        self.routing_tables.setdefault(device.index, PrefixTrie()).insert(network, prefix_length, next_hop)
 
     def generate_routing_tables(self):
-        for device in self.devices:
-            for connected_device in device.connected_devices:
-                device.add_routing_entry(connected_device.ipv4_address, connected_device.ipv4_address)
+        # One aggregated route per segment: on-link for the device's own subnet (and for the
+        # hub/switch on every prefix it anchors), otherwise the next hop toward that hub/switch
+        # (or the segment's first host on a plain L1 network)
+        segments = self.ipam.segments
+        routes = np.full((len(self), len(segments)), UNREACHABLE, dtype=np.int32)
+        if segments:
+            members = {segment.segment_id: [] for segment in segments}
+            for device in self.devices:
+                if device.segment is not None:
+                    members[device.segment.segment_id].append(device.index)
+            gateways = {}
+            for segment in segments:
+                hosts = members[segment.segment_id]
+                if len(hosts) == len(self):
+                    continue  # Everything is on-link, so there is nothing to search for
+                if segment.anchor is not None or hosts:
+                    gateways[segment.segment_id] = segment.anchor.index if segment.anchor is not None else hosts[0]
+            if gateways:
+                self.routing.compute(gateway for gateway in set(gateways.values()) if gateway not in self.routing.next_hop)
+            for segment_id, gateway in gateways.items():
+                routes[:, segment_id] = self.routing.row(gateway)
+                if segments[segment_id].anchor is not None:
+                    routes[gateway, segment_id] = CONNECTED
+            for segment_id, hosts in members.items():
+                routes[hosts, segment_id] = CONNECTED
+        self.segment_routes = routes
+
+    def lookup_route(self, device, address):
+        # Longest-prefix match across static routes and segment routes; returns the next-hop
+        # Device, CONNECTED for on-link destinations, or None
+        value = parse_ipv4(address)
+        static = self.routing_tables.get(device.index)
+        best = static.lookup(value) if static is not None else None
+        match = self.ipam.prefixes.lookup(value)
+        if match is not None and (best is None or match[0] > best[0]):
+            if self.segment_routes is None:
+                self.generate_routing_tables()
+            hop = int(self.segment_routes[device.index, match[1]])
+            if hop == CONNECTED:
+                return CONNECTED
+            return self.device_at(hop) if hop >= 0 else None
+        if best is None:
+            return None
+        next_hop = best[1]
+        return self.get_device(next_hop) if next_hop in self else self.device_by_address(next_hop)
+
+    def routing_table(self, device):
+        table = {}
+        if self.segment_routes is not None and device.index < len(self.segment_routes):
+            for segment, hop in zip(self.ipam.segments, self.segment_routes[device.index].tolist()):
+                if hop == CONNECTED:
+                    table[segment.cidr] = 'connected'
+                elif hop >= 0:
+                    gateway = self.device_at(hop)
+                    table[segment.cidr] = gateway.ipv4_address or gateway.device_id
+        static = self.routing_tables.get(device.index)
+        if static is not None:
+            for network, prefix_length, next_hop in static.items():
+                table[f"{format_ipv4(network)}/{prefix_length}"] = next_hop
+        return table
+
+class LazyTopology(Topology):
+    # Star, bus, ring and mesh described only by their type and size. Devices are created on
+    # demand, neighbors and paths are computed in closed form, and the full edge set is only
+    # built (materialize) when something needs all of it, such as plotting or editing.
+    kinds = ('star', 'bus', 'ring', 'mesh')
+    device_classes = {'Hub': Hub, 'Repeater': Repeater, 'Device': Device}
+
+    def __init__(self, topology_type, num_devices):
+        self.topology_type = topology_type.lower()
+        self.num_devices = num_devices
+        self.materialized = False
+        self._created = {}  # index -> Device, for devices touched before materialization
+        super().__init__()
+        self.kind = self.topology_type
+        self._devices = None
+        self._adjacency = None
+
+    # Index layout matches the eager builders: star is Hub1 then Device1..n,
+    # the others interleave Repeater k (index 2k-2) and Device k (index 2k-1)
+
+    def __len__(self):
+        return self.num_devices + 1 if self.topology_type == 'star' else 2 * self.num_devices
+
+    def __contains__(self, device_id):
+        return self.index_of(device_id) is not None
+
+    def index_of(self, device_id):
+        if self.materialized:
+            return super().index_of(device_id)
+        prefix = device_id.rstrip('0123456789')
+        number = device_id[len(prefix):]
+        if not number or number[0] == '0' or not 1 <= int(number) <= self.num_devices:
+            return None
+        k = int(number)
+        if self.topology_type == 'star':
+            if prefix == 'Hub':
+                return 0 if k == 1 else None
+            return k if prefix == 'Device' else None
+        if prefix == 'Repeater':
+            return 2 * k - 2
+        return 2 * k - 1 if prefix == 'Device' else None
+
+    def device_name(self, index):
+        if self.topology_type == 'star':
+            return ('Hub', 1) if index == 0 else ('Device', index)
+        return ('Repeater' if index % 2 == 0 else 'Device', index // 2 + 1)
+
+    def get_device(self, device_id):
+        index = self.index_of(device_id)
+        if index is None:
+            raise KeyError(device_id)
+        return self.device_at(index)
+
+    def device_at(self, index):
+        if self._devices is not None:
+            return self._devices[index]
+        device = self._created.get(index)
+        if device is None:
+            kind, number = self.device_name(index)
+            device = self.device_classes[kind](f"{kind}{number}")
+            device.index = index
+            device.topology = self
+            self._created[index] = device
+        return device
+
+    @property
+    def devices(self):
+        if self._devices is None:
+            self._devices = [self.device_at(i) for i in range(len(self))]
+            self._created = {}
+        return self._devices
+
+    @devices.setter
+    def devices(self, devices):
+        self._devices = devices
+
+    @property
+    def adjacency(self):
+        self.materialize()
+        return self._adjacency
+
+    @adjacency.setter
+    def adjacency(self, adjacency):
+        self._adjacency = adjacency
+
+    @property
+    def graph(self):
+        self.materialize()
+        return Topology.graph.fget(self)
+
+    def edges(self):
+        n = self.num_devices
+        if self.topology_type == 'star':
+            for i in range(1, n + 1):
+                yield 0, i
+            return
+        for k in range(n):
+            yield 2 * k, 2 * k + 1
+        if self.topology_type == 'bus':
+            for k in range(n - 1):
+                yield 2 * k, 2 * k + 2
+        elif self.topology_type == 'ring':
+            for k in range(n if n > 2 else n - 1):
+                yield 2 * k, 2 * ((k + 1) % n)
+        else:
+            for k in range(n):
+                for other in range(k + 1, n):
+                    yield 2 * k, 2 * other
+
+    def edge_count(self):
+        if self.materialized:
+            return super().edge_count()
+        n = self.num_devices
+        if self.topology_type == 'star':
+            return n
+        if self.topology_type == 'bus':
+            return n + max(0, n - 1)
+        if self.topology_type == 'ring':
+            return n + (n if n > 2 else max(0, n - 1))
+        return n + n * (n - 1) // 2
+
+    def edge_array(self):
+        if self.materialized:
+            return super().edge_array()
+        return np.fromiter(itertools.chain.from_iterable(self.edges()), dtype=np.int64, count=2 * self.edge_count()).reshape(-1, 2)
+
+    def adjacency_csr(self):
+        # Straight from the closed-form edge list, so load runs and searches keep the topology lazy
+        if self.materialized:
+            return super().adjacency_csr()
+        edges = self.edge_array()
+        directed = np.concatenate((edges, edges[:, ::-1]))
+        directed = directed[np.lexsort((directed[:, 1], directed[:, 0]))]
+        indptr = np.zeros(len(self) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(directed[:, 0], minlength=len(self)), out=indptr[1:])
+        return indptr, np.ascontiguousarray(directed[:, 1])
+
+    def estimated_bytes(self):
+        if self.materialized:
+            return super().estimated_bytes()
+        return 450 * len(self._created if self._devices is None else self._devices)
+
+    def materialize(self):
+        if self.materialized:
+            return
+        devices = self.devices
+        self.device_index = {device.device_id: device.index for device in devices}
+        self._adjacency = [set() for _ in devices]
+        self.materialized = True
+        routing, self._routing = self._routing, None  # Holds no rows yet, so link() has nothing to patch
+        with gc_paused():
+            for i, j in self.edges():
+                self.link(i, j)
+        self._routing = routing
+
+    def neighbors(self, index):
+        if self.materialized:
+            return self._adjacency[index]
+        n = self.num_devices
+        if self.topology_type == 'star':
+            return range(1, n + 1) if index == 0 else (0,)
+        if index % 2:
+            return (index - 1,)
+        k = index // 2
+        if self.topology_type == 'mesh':
+            return [index + 1] + [2 * other for other in range(n) if other != k]
+        neighbors = [index + 1]
+        if self.topology_type == 'bus':
+            if k > 0:
+                neighbors.append(index - 2)
+            if k < n - 1:
+                neighbors.append(index + 2)
+        else:
+            for other in {(k - 1) % n, (k + 1) % n} - {k}:
+                neighbors.append(2 * other)
+        return neighbors
+
+    def shortest_path(self, source, target):
+        if self.materialized:
+            return super().shortest_path(source, target)
+        if source == target:
+            return [source]
+        if self.topology_type == 'star':
+            return [source, target] if 0 in (source, target) else [source, 0, target]
+        start, end = source // 2, target // 2  # Repeater positions of both endpoints
+        n = self.num_devices
+        if start == end:
+            walk = [start]
+        elif self.topology_type == 'bus':
+            step = 1 if end > start else -1
+            walk = list(range(start, end + step, step))
+        elif self.topology_type == 'ring':
+            forward = (end - start) % n
+            if 2 * forward == n:
+                # Both ways are equally short; breadth_first_search picks start's lower-indexed
+                # neighbor, which is the next position only at either end of the numbering
+                step = 1 if start in (0, n - 1) else -1
+            else:
+                step = 1 if forward < n - forward else -1
+            walk = [(start + step * i) % n for i in range(min(forward, n - forward) + 1)]
+        else:
+            walk = [start, end]
+        path = [source] if source % 2 else []
+        path.extend(2 * k for k in walk)
+        if target % 2:
+            path.append(target)
+        return path
+
+    def traffic_load(self, matrix, workers=None, parallel_cells=1 << 26):
+        # Same routes as shortest_path, summed with difference arrays along the repeater chain
+        # instead of a search per destination
+        if self.materialized:
+            return super().traffic_load(matrix, workers, parallel_cells)
+        n = len(self)
+        local = matrix.sources == matrix.destinations
+        device_load = np.zeros(n)
+        device_load += np.bincount(matrix.sources[local], weights=matrix.volumes[local], minlength=n)
+        sources, destinations, volumes = matrix.sources[~local], matrix.destinations[~local], matrix.volumes[~local]
+        hops = []  # (from, to, load) arrays of directed edge traffic
+        if self.topology_type == 'star':
+            device_load += np.bincount(sources, weights=volumes, minlength=n) + np.bincount(destinations, weights=volumes, minlength=n)
+            via_hub = (sources != 0) & (destinations != 0)
+            device_load[0] += volumes[via_hub].sum()
+            up, down = sources != 0, destinations != 0
+            hops.append((sources[up], np.zeros(int(up.sum()), dtype=np.int64), volumes[up]))
+            hops.append((np.zeros(int(down.sum()), dtype=np.int64), destinations[down], volumes[down]))
+        else:
+            m = self.num_devices
+            starts, ends = sources // 2, destinations // 2  # Repeater positions
+            first, last = sources % 2 == 1, destinations % 2 == 1  # Endpoints that are devices, not repeaters
+            device_load += np.bincount(sources[first], weights=volumes[first], minlength=n)
+            device_load += np.bincount(destinations[last], weights=volumes[last], minlength=n)
+            hops.append((sources[first], 2 * starts[first], volumes[first]))
+            hops.append((2 * ends[last], destinations[last], volumes[last]))
+            repeaters = np.zeros(m)
+            if self.topology_type == 'mesh':
+                moved = starts != ends
+                hops.append((2 * starts[moved], 2 * ends[moved], volumes[moved]))
+                repeaters += np.bincount(starts, weights=volumes, minlength=m) + np.bincount(ends[moved], weights=volumes[moved], minlength=m)
+            else:
+                if self.topology_type == 'bus':
+                    forward = ends >= starts
+                    lengths = np.abs(ends - starts)
+                else:
+                    ahead = (ends - starts) % m
+                    forward = np.where(2 * ahead == m, (starts == 0) | (starts == m - 1), ahead < m - ahead)  # Ties as in shortest_path
+                    lengths = np.where(forward, ahead, m - ahead)
+                # Forward walks cover positions [start, start + length], backward ones
+                # [start - length, start]; both are shifted into [0, 2m) and folded back
+                low = np.where(forward, starts, starts - lengths + m)
+                for moving, step in ((forward, 1), (~forward, -1)):
+                    spans = (np.bincount(low[moving], weights=volumes[moving], minlength=2 * m + 1)
+                             - np.bincount(low[moving] + lengths[moving], weights=volumes[moving], minlength=2 * m + 1))
+                    edges = np.cumsum(spans)[:2 * m]
+                    edges = edges[:m] + edges[m:]  # Load on the edge between position p and p + 1
+                    p = np.flatnonzero(edges > 0)
+                    after = (p + 1) % m
+                    hops.append((2 * p, 2 * after, edges[p]) if step == 1 else (2 * after, 2 * p, edges[p]))
+                spans = (np.bincount(low, weights=volumes, minlength=2 * m + 1)
+                         - np.bincount(low + lengths + 1, weights=volumes, minlength=2 * m + 1))
+                visits = np.cumsum(spans)[:2 * m]
+                repeaters += visits[:m] + visits[m:]
+            device_load[0::2] += repeaters
+        indptr, indices = self.routing.csr()
+        keys = np.repeat(np.arange(n, dtype=np.int64), np.diff(indptr)) * n + indices
+        hop_from, hop_to, hop_load = (np.concatenate(parts) for parts in zip(*hops))
+        edge_load = np.zeros(len(indices))
+        edge_load += np.bincount(np.searchsorted(keys, hop_from * n + hop_to), weights=hop_load, minlength=len(indices))
+        return edge_load, device_load, 0.0
+
+    def shortest_paths(self, pairs):
+        if self.materialized:
+            return super().shortest_paths(pairs)
+        return [self.shortest_path(source, target) for source, target in pairs]
+
+    def add_device(self, device):
+        self.materialize()
+        return super().add_device(device)
+
+    def add_devices(self, devices):
+        self.materialize()
+        super().add_devices(devices)
+
+    def link(self, i, j):
+        self.materialize()
+        return super().link(i, j)
+
+    def remove_device(self, device):
+        self.materialize()
+        super().remove_device(device)
+
+    def calculate_collision_domains(self):
+        return 1 if self.topology_type == 'star' else 0
 
 class Simulation:
-    def __init__(self):
+    def __init__(self, lazy=False):
         self.topology = Topology()
+        self.lazy = lazy
+        self.delivery = None
+        self.image = None  # PNG of the topology from the last run_simulation*
 
     def create_network(self, num_devices, topology_type):
-        if topology_type.lower() == 'star':
+        with gc_paused():
+            self._create_network(num_devices, topology_type)
+
+    def _create_network(self, num_devices, topology_type):
+        if self.lazy and topology_type.lower() in LazyTopology.kinds and not len(self.topology):
+            self.topology = LazyTopology(topology_type, num_devices)
+        elif topology_type.lower() == 'star':
             devices = [Device(f"Device{i+1}") for i in range(num_devices)]
             hub = Hub("Hub1")
             self.topology.create_star_topology(devices, hub)
@@ -197,44 +1586,139 @@ class Simulation:
             devices = [Device(f"Device{i+1}") for i in range(num_devices)]
             self.topology.create_mesh_topology(devices, repeaters)
         else:
-            print("Invalid topology type.")
+            logger.warning("Invalid topology type %r.", topology_type)
 
     def check_message_path(self, sender_id, receiver_id):
-        if sender_id not in self.topology.graph.nodes or receiver_id not in self.topology.graph.nodes:
-            print("Invalid sender or receiver device ID.")
+        if sender_id not in self.topology or receiver_id not in self.topology:
+            logger.info("Invalid sender or receiver device ID: %r, %r.", sender_id, receiver_id)
             return False
 
-        try:
-            path = nx.shortest_path(self.topology.graph, source=sender_id, target=receiver_id)
-            print("Path found:", " -> ".join(path))
-            return path
-        except nx.NetworkXNoPath:
-            print("No path found between the sender and receiver.")
+        topology = self.topology
+        path = topology.shortest_path(topology.index_of(sender_id), topology.index_of(receiver_id))
+        if path is None:
+            logger.info("No path found between %s and %s.", sender_id, receiver_id)
             return False
+        path = [topology.device_at(i).device_id for i in path]
+        if logger.isEnabledFor(logging.INFO):  # Joining a long path is not free, so only when it is logged
+            logger.info("Path found: %s", " -> ".join(path), extra={'hops': len(path) - 1})
+        return path
 
     def send_message(self, path, message, receiver_id):
-        for i in range(len(path) - 1):
-            sender = next(device for device in self.topology.devices if device.device_id == path[i])
-            receiver = next(device for device in self.topology.devices if device.device_id == path[i + 1])
-            sender_mac = sender.generate_mac_address() if not isinstance(sender, Switch) else receiver.mac_address
-            receiver_mac = receiver.generate_mac_address() if not isinstance(receiver, Switch) else sender.mac_address
-            if isinstance(sender, Repeater):
-                sender.send_data(message, receiver_mac)
-            elif isinstance(sender, Switch):
-                sender.send_data({'source_mac': sender_mac, 'dest_mac': receiver_mac, 'data': message})
-            else:
-                sender.send_data(message)
-            print(f"Message sent from {sender_mac} to {receiver_mac}")
+        route = [self.topology.index_of(device_id) for device_id in path]
+        transfer = self.topology.start_transfer(self.topology.device_at(route[0]), self.topology.get_device(receiver_id), message, route=route)
+        self.topology.scheduler.run()
+        return transfer.result()
+
+    def send_messages(self, transmissions):
+        # Puts every (sender_id, receiver_id, message) frame in flight before running the clock
+        get_device = self.topology.get_device
+        transfers = [self.topology.start_transfer(get_device(sender_id), get_device(receiver_id), message)
+                     for sender_id, receiver_id, message in transmissions]
+        self.topology.scheduler.run()
+        return [transfer.result() for transfer in transfers]
+
+    def simulate_batch(self, transmissions, switched=False, concurrent=False):
+        # Delivers many (sender_id, receiver_id, message) tuples with their paths resolved in one pass.
+        # Each transfer runs on a quiet network unless concurrent, which puts every frame in flight at once
+        topology = self.topology
+        known = [i for i, (sender_id, receiver_id, _) in enumerate(transmissions) if sender_id in topology and receiver_id in topology]
+        routes = dict(zip(known, topology.shortest_paths((topology.index_of(transmissions[i][0]), topology.index_of(transmissions[i][1])) for i in known)))
+        results, transfers = [], {}
+        for i, (sender_id, receiver_id, message) in enumerate(transmissions):
+            result = {'sender_id': sender_id, 'receiver_id': receiver_id}
+            results.append(result)
+            if i not in routes:
+                result['error'] = "Invalid sender or receiver device ID."
+                continue
+            route = routes[i]
+            if route is None:
+                result['error'] = "No path found between the sender and receiver."
+                continue
+            sender, receiver = topology.device_at(route[0]), topology.device_at(route[-1])
+            result['path'] = [topology.device_at(index).device_id for index in route]
+            result['hops'] = len(route) - 1
+            result['sender'] = {'mac_address': sender.generate_mac_address(), 'ipv4_address': sender.ipv4_address}
+            result['receiver'] = {'mac_address': receiver.generate_mac_address(), 'ipv4_address': receiver.ipv4_address}
+            if len(route) == 1:
+                result['delivery'] = {'delivered': True, 'delivery_time': 0.0, 'hops': 0, 'frames_generated': 0, 'receptions': 0}
+                continue
+            transfers[i] = topology.start_transfer(sender, receiver, message, route=None if switched else route)
+            if not concurrent:
+                topology.scheduler.run()
+        if concurrent:
+            topology.scheduler.run()
+        for i, transfer in transfers.items():
+            results[i]['delivery'] = transfer.result()
+        return results
+
+    def simulate_load(self, matrix, workers=None, top=10):
+        # Offered load of a TrafficMatrix: busiest links and devices, and contention on each hub's
+        # shared medium, where every frame entering the hub is repeated out of every port
+        if top < 0:
+            raise ValueError("top must be non-negative")
+        topology = self.topology
+        edge_load, device_load, dropped = topology.traffic_load(matrix, workers)
+        indptr, indices = topology.routing.csr()
+        n = len(indptr) - 1
+        owners = np.repeat(np.arange(n, dtype=np.int64), np.diff(indptr))
+        keys = owners * n + indices  # Sorted, so a directed edge is found by binary search
+        bandwidth = np.full(len(indices), Link().bandwidth, dtype=np.float64)
+        for (i, j), (_, link_bandwidth) in topology.link_settings.items():
+            if link_bandwidth is not None:
+                bandwidth[np.searchsorted(keys, [i * n + j, j * n + i])] = link_bandwidth
+        utilization = edge_load * 8 / bandwidth
+        links = []
+        for position in np.argsort(-utilization, kind='stable')[:top]:
+            if edge_load[position] <= 0:
+                break
+            links.append({'from': topology.device_at(int(owners[position])).device_id,
+                          'to': topology.device_at(int(indices[position])).device_id,
+                          'load': float(edge_load[position]), 'utilization': float(utilization[position])})
+        devices = [{'device_id': topology.device_at(int(index)).device_id, 'load': float(device_load[index])}
+                   for index in np.argsort(-device_load, kind='stable')[:top] if device_load[index] > 0]
+        hubs = []
+        for device in topology.devices:
+            if isinstance(device, Hub):
+                ports = slice(indptr[device.index], indptr[device.index + 1])
+                into_hub = edge_load[np.searchsorted(keys, indices[ports] * n + device.index)]
+                offered = float(into_hub.sum())
+                medium = float(bandwidth[ports].min()) if into_hub.size else Link().bandwidth
+                hubs.append({'hub': device.device_id, 'ports': int(into_hub.size), 'active_senders': int((into_hub > 0).sum()),
+                             'offered_load': offered, 'utilization': offered * 8 / medium})
+        return {
+            'flows': len(matrix),
+            'offered_volume': matrix.total,
+            'dropped_volume': dropped,
+            'max_link_utilization': float(utilization.max()) if len(utilization) else 0.0,
+            'bottleneck_links': links,
+            'busiest_devices': devices,
+            'collision_domains': hubs,
+        }
+
+    def broadcast(self, sender_id, message):
+        transfer = self.topology.start_transfer(self.topology.get_device(sender_id), None, message)
+        self.topology.scheduler.run()
+        return transfer.result()
 
     def run_simulation(self, num_devices, topology_type, sender_id, receiver_id, message):
-        self.create_network(num_devices, topology_type)
-        print("Devices in the network:", [device.device_id for device in self.topology.devices])
+        with metrics.phase('build'):
+            self.create_network(num_devices, topology_type)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Devices in the network: %s", [device.device_id for device in self.topology.devices])
 
-        path = self.check_message_path(sender_id, receiver_id)
+        with metrics.phase('path'):
+            path = self.check_message_path(sender_id, receiver_id)
         if path:
-            self.topology.assign_ipv4_addresses()  # Assign IPv4 addresses
-            self.topology.plot_topology()
-            self.topology.generate_routing_tables()  # Generate routing tables
+            with metrics.phase('delivery'):
+                self.delivery = self.send_message(path, message, receiver_id)
+            with metrics.phase('ipv4'):
+                self.topology.assign_ipv4_addresses()  # Assign IPv4 addresses
+            with metrics.phase('layout'):
+                positions = topology_renderer.layout(self.topology)
+            with metrics.phase('render'):
+                self.image = self.topology.plot_topology(positions)
+            with metrics.phase('routing'):
+                self.topology.generate_routing_tables()  # Generate routing tables
 
             broadcast_domains = (self.topology.calculate_broadcast_domains())-1
             collision_domains = self.topology.calculate_collision_domains()
@@ -244,6 +1728,10 @@ class Simulation:
             return False, None, 0, 0
 
     def create_network_with_switch(self, num_topologies, devices_per_topology):
+        with gc_paused():
+            self._create_network_with_switch(num_topologies, devices_per_topology)
+
+    def _create_network_with_switch(self, num_topologies, devices_per_topology):
         hubs = []
         for i in range(num_topologies):
             devices = [Device(f"Device{i+1}_{j+1}") for j in range(devices_per_topology[i])]
@@ -257,18 +1745,36 @@ class Simulation:
         self.topology.create_connection(switch, router)  # Connect switch to router
 
         for hub in hubs:
-            self.topology.add_device(switch)
             self.topology.create_connection(hub, switch)
 
+    def prepare_scenario(self, broadcast_domains, collision_domains, switched=False):
+        with metrics.phase('ipv4'):
+            self.topology.assign_ipv4_addresses()
+        return Scenario(self, broadcast_domains, collision_domains, switched)
+
+    def switch_stats(self):
+        return {device.device_id: dict(device.mac_table.stats, entries=len(device.mac_table))
+                for device in self.topology.devices if isinstance(device, Switch)}
+
     def run_simulation_with_switch(self, num_topologies, devices_per_topology, sender_id, receiver_id, message):
-        self.create_network_with_switch(num_topologies, devices_per_topology)
-        print("Devices in the network with switch:", [device.device_id for device in self.topology.devices])
+        with metrics.phase('build'):
+            self.create_network_with_switch(num_topologies, devices_per_topology)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Devices in the network with switch: %s", [device.device_id for device in self.topology.devices])
 
-        path = self.check_message_path(sender_id, receiver_id)
+        with metrics.phase('path'):
+            path = self.check_message_path(sender_id, receiver_id)
         if path:
-            self.topology.assign_ipv4_addresses()  # Assign IPv4 addresses
-            self.topology.plot_topology()
-            self.topology.generate_routing_tables()  # Generate routing tables
+            with metrics.phase('delivery'):
+                self.delivery = self.send_messages([(sender_id, receiver_id, message)])[0]  # Switched, not source-routed
+            with metrics.phase('ipv4'):
+                self.topology.assign_ipv4_addresses()  # Assign IPv4 addresses
+            with metrics.phase('layout'):
+                positions = topology_renderer.layout(self.topology)
+            with metrics.phase('render'):
+                self.image = self.topology.plot_topology(positions)
+            with metrics.phase('routing'):
+                self.topology.generate_routing_tables()  # Generate routing tables
 
             broadcast_domains = self.topology.calculate_broadcast_domains()
             collision_domains = num_topologies +1  # Number of star topologies equals collision domains
@@ -277,44 +1783,868 @@ class Simulation:
         else:
             return False, None, 0, 0
 
-@app.route('/', methods=['GET', 'POST'])
-def index():
-    if request.method == 'POST':
-        use_switch = request.form.get('use_switch') == 'yes'
-        if not use_switch:
-            num_devices = int(request.form['num_devices'])
-            topology_type = request.form['topology_type']
-            sender_id = request.form['sender_id']
-            receiver_id = request.form['receiver_id']
-            message = request.form['message']
-
-            simulation = Simulation()
-            success, path, broadcast_domains, collision_domains = simulation.run_simulation(num_devices, topology_type, sender_id, receiver_id, message)
-            if success:
-                mac_addresses = {device.device_id: device.generate_mac_address() for device in simulation.topology.devices}
-                ip_addresses = {device.device_id: device.ipv4_address for device in simulation.topology.devices}
-                routing_tables = {device.ipv4_address: device.routing_table for device in simulation.topology.devices}
-                return render_template('index.html', plot_available=True, path=path, message=message, mac_addresses=mac_addresses, ip_addresses=ip_addresses, broadcast_domains=broadcast_domains, collision_domains=collision_domains, routing_tables=routing_tables)
+class TopologyRenderer:
+    # Object-oriented Agg rendering into memory buffers, safe to run from concurrent requests.
+    # Star, bus, ring and mesh get closed-form coordinates, trees (such as the switched network)
+    # a radial layout, and other graphs of up to spring_limit devices a seeded spring layout.
+    # Labels are dropped past label_limit devices, and past cluster_limit devices (or edge_limit
+    # edges), or for larger graphs without a layout, the plot shows aggregated clusters instead.
+    formats = {'png': 'image/png', 'svg': 'image/svg+xml'}
+
+    def __init__(self, label_limit=150, spring_limit=300, cluster_limit=3000, edge_limit=100_000, clusters=48, figsize=(6.4, 4.8), dpi=100):
+        self.label_limit = label_limit
+        self.spring_limit = spring_limit
+        self.cluster_limit = cluster_limit
+        self.edge_limit = edge_limit
+        self.clusters = clusters
+        self.figsize = figsize
+        self.dpi = dpi
+
+    def layout_cost(self, kind, devices, links):
+        # Rough layout work in the units of devices plus links, for deciding what runs in a job:
+        # nothing for closed-form shapes, three BFS passes for a tree, and the quadratic spring
+        # layout for anything else small enough to get one
+        if kind in ('star', 'bus', 'ring', 'mesh'):
+            return 0
+        if kind == 'switch' or links == devices - 1:
+            return 3 * (devices + links)
+        if devices > self.spring_limit or links > self.edge_limit:
+            return 0  # Drawn as clusters
+        return devices * devices
+
+    def clustered(self, topology):
+        return len(topology) > self.cluster_limit or topology.edge_count() > self.edge_limit
+
+    def layout(self, topology):
+        # Device positions as an (n, 2) array indexed like topology.devices
+        n = len(topology)
+        kind = topology.kind
+        if kind == 'star':
+            angles = 2 * np.pi * np.arange(n - 1) / max(1, n - 1)
+            positions = np.zeros((n, 2))
+            positions[1:, 0] = np.cos(angles)
+            positions[1:, 1] = np.sin(angles)
+            return positions
+        if kind in ('bus', 'ring', 'mesh'):
+            steps = np.arange(n // 2)
+            positions = np.empty((n, 2))
+            if kind == 'bus':
+                positions[0::2, 0] = positions[1::2, 0] = steps
+                positions[0::2, 1] = 0.0
+                positions[1::2, 1] = -1.0
             else:
-                return render_template('index.html', plot_available=False, error_message="No path found between the sender and receiver.")
+                angles = 2 * np.pi * steps / max(1, n // 2)
+                circle = np.column_stack((np.cos(angles), np.sin(angles)))
+                positions[0::2] = circle
+                positions[1::2] = circle * 1.6
+            return positions
+        positions = self.tree_layout(topology)
+        if positions is not None:
+            return positions
+        if self.clustered(topology) or n > self.spring_limit:
+            return None  # Only cluster centres get laid out
+        layout = nx.spring_layout(topology.graph, seed=0)
+        return np.array([layout[device.device_id] for device in topology.devices]).reshape(-1, 2)
+
+    def tree_layout(self, topology):
+        # Radial layout of a connected tree, or None: rings by hop count from the tree's centre,
+        # each subtree in an angular wedge proportional to its number of leaves
+        n = len(topology)
+        if n < 3 or topology.edge_count() != n - 1:
+            return None
+        indptr, _ = topology.routing.csr()
+        _, distance = topology.routing.search([0])
+        if (distance < 0).any():
+            return None
+        far = int(distance[0].argmax())
+        next_hop, distance = topology.routing.search([far])
+        centre = int(distance[0].argmax())
+        for _ in range(int(distance[0].max()) // 2):  # Halfway along a longest path
+            centre = int(next_hop[0, centre])
+        parent, depth = topology.routing.search([centre])
+        parent, depth = parent[0].astype(np.int64), depth[0]
+        weight = (np.diff(indptr) == 1).astype(np.float64)  # Leaves
+        weight[centre] = 0.0
+        levels = [np.flatnonzero(depth == level) for level in range(int(depth.max()) + 1)]
+        for nodes in reversed(levels[1:]):
+            weight += np.bincount(parent[nodes], weights=weight[nodes], minlength=n)
+        span = 2 * np.pi * weight / weight[centre]
+        start = np.zeros(n)
+        for nodes in levels[1:]:
+            nodes = nodes[np.argsort(parent[nodes], kind='stable')]  # Siblings side by side, by index
+            parents = parent[nodes]
+            before = np.cumsum(span[nodes]) - span[nodes]
+            first = np.flatnonzero(np.r_[True, parents[1:] != parents[:-1]])
+            group = np.repeat(first, np.diff(np.r_[first, len(nodes)]))
+            start[nodes] = start[parents] + before - before[group]
+        angles = start + span / 2
+        return np.column_stack((depth * np.cos(angles), depth * np.sin(angles)))
+
+    def render(self, topology, positions=None, fmt='png'):
+        if fmt not in self.formats:
+            raise ValueError(f"Unsupported plot format {fmt}")
+        figure = Figure(figsize=self.figsize, dpi=self.dpi)
+        FigureCanvasAgg(figure)
+        axes = figure.add_subplot()
+        axes.set_axis_off()
+        axes.set_title('Network Topology')
+        if positions is None:
+            positions = self.layout(topology)
+        if positions is None or self.clustered(topology):
+            self.draw_clusters(axes, topology, positions)
+        else:
+            self.draw_devices(axes, topology, positions)
+        buffer = io.BytesIO()
+        figure.savefig(buffer, format=fmt)
+        return buffer.getvalue()
+
+    def draw_devices(self, axes, topology, positions):
+        n = len(topology)
+        edges = topology.edge_array()
+        if len(edges):
+            axes.add_collection(LineCollection(positions[edges], colors='black', linewidths=1.0 if n <= self.label_limit else 0.3, zorder=1))
+        axes.scatter(positions[:, 0], positions[:, 1], s=800 if n <= 20 else max(4, 16000 / n), c='skyblue', zorder=2)
+        if n <= self.label_limit:
+            for device, (x, y) in zip(topology.devices, positions):
+                axes.text(x, y, device.device_id, ha='center', va='center', fontsize=10 if n <= 20 else 6, fontweight='bold', zorder=3)
+        axes.autoscale_view()
+
+    def cluster_labels(self, topology):
+        n = len(topology)
+        if topology.kind is not None:
+            labels = np.arange(n) * self.clusters // max(1, n)  # Runs of neighbouring indices
+        else:
+            anchors = {}
+            labels = np.empty(n, dtype=np.int64)
+            for device in topology.devices:
+                anchor = topology.segment_anchor(device)
+                labels[device.index] = anchors.setdefault(anchor.index if anchor is not None else -1, len(anchors))
+        return np.unique(labels, return_inverse=True)[1]
+
+    def draw_clusters(self, axes, topology, positions):
+        labels = self.cluster_labels(topology)
+        count = int(labels.max()) + 1 if len(labels) else 0
+        sizes = np.bincount(labels, minlength=count)
+        if topology.kind == 'mesh':
+            pairs = np.column_stack(np.triu_indices(count, 1))  # Every cluster meets every other one
+            weights = np.ones(len(pairs))
+        else:
+            edges = labels[topology.edge_array()]
+            edges = np.sort(edges[edges[:, 0] != edges[:, 1]], axis=1)
+            pairs, weights = np.unique(edges, axis=0, return_counts=True)
+        if positions is not None:
+            centres = np.column_stack([np.bincount(labels, positions[:, axis], count) for axis in (0, 1)]) / sizes[:, None]
+        else:
+            graph = nx.Graph()
+            graph.add_nodes_from(range(count))
+            graph.add_edges_from(map(tuple, pairs.tolist()))
+            layout = nx.spring_layout(graph, seed=0)
+            centres = np.array([layout[cluster] for cluster in range(count)]).reshape(-1, 2)
+        if len(pairs):
+            axes.add_collection(LineCollection(centres[pairs], colors='gray', linewidths=0.5 + np.log1p(weights) / 2, zorder=1))
+        axes.scatter(centres[:, 0], centres[:, 1], s=40 + 400 * sizes / max(1, sizes.max()), c='skyblue', zorder=2)
+        if count <= self.label_limit:
+            for (x, y), size in zip(centres, sizes.tolist()):
+                axes.text(x, y, str(size), ha='center', va='center', fontsize=7, zorder=3)
+        axes.set_title(f'Network Topology ({len(topology)} devices in {count} clusters)')
+        axes.autoscale_view()
+
+class RenderStore:
+    # Rendered plots by token in a bounded LRU, each served from its own /render/<token> URL
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # token -> (image bytes, mimetype)
+        self.current_bytes = 0
+        self._lock = threading.Lock()
+
+    def put(self, image, mimetype, token=None):
+        token = token or uuid.uuid4().hex
+        with self._lock:
+            previous = self.entries.pop(token, None)
+            if previous is not None:
+                self.current_bytes -= len(previous[0])
+            self.entries[token] = (image, mimetype)
+            self.current_bytes += len(image)
+            while self.current_bytes > self.max_bytes and len(self.entries) > 1:
+                _, (evicted, _) = self.entries.popitem(last=False)
+                self.current_bytes -= len(evicted)
+        return token
+
+    def get(self, token):
+        with self._lock:
+            entry = self.entries.get(token)
+            if entry is not None:
+                self.entries.move_to_end(token)
+            return entry
+
+    def discard(self, token):
+        with self._lock:
+            entry = self.entries.pop(token, None)
+            if entry is not None:
+                self.current_bytes -= len(entry[0])
+
+    def info(self):
+        with self._lock:
+            return {'entries': len(self.entries), 'bytes': self.current_bytes, 'max_bytes': self.max_bytes}
+
+topology_renderer = TopologyRenderer()
+render_store = RenderStore()
+
+class Scenario:
+    # A built, addressed simulation reused across requests. The per-device details, layout and
+    # plots are only worked out once a view asks for them
+    def __init__(self, simulation, broadcast_domains, collision_domains, switched=False):
+        self.simulation = simulation
+        self.broadcast_domains = broadcast_domains
+        self.collision_domains = collision_domains
+        self.switched = switched
+        self.details = None
+        self.positions = None
+        self.images = {}  # format -> rendered bytes
+        self.tokens = {}  # format -> RenderStore token
+        self.lock = threading.Lock()  # The event clock and switch tables are not thread-safe
+
+    @property
+    def nbytes(self):
+        size = self.simulation.topology.estimated_bytes() + sum(map(len, self.images.values()))
+        if self.positions is not None:
+            size += self.positions.nbytes
+        if self.details is not None:
+            size += 300 * len(self.details['mac_addresses'])
+        return size
+
+    def describe(self):
+        # Addresses and routing tables of every device, for the HTML view
+        with self.lock:
+            if self.details is None:
+                topology = self.simulation.topology
+                with metrics.phase('routing'):
+                    topology.generate_routing_tables()
+                self.details = {
+                    'mac_addresses': {device.device_id: device.generate_mac_address() for device in topology.devices},
+                    'ip_addresses': {device.device_id: device.ipv4_address for device in topology.devices},
+                    'routing_tables': {device.ipv4_address: device.routing_table for device in topology.devices},
+                    'broadcast_domains': self.broadcast_domains,
+                    'collision_domains': self.collision_domains,
+                }
+            return self.details
+
+    def deliver(self, sender_id, receiver_id, message):
+        simulation = self.simulation
+        with self.lock:
+            with metrics.phase('path'):
+                path = simulation.check_message_path(sender_id, receiver_id)
+            if not path:
+                return None, None
+            with metrics.phase('delivery'):
+                if self.switched:
+                    delivery = simulation.send_messages([(sender_id, receiver_id, message)])[0]
+                else:
+                    delivery = simulation.send_message(path, message, receiver_id)
+            return path, delivery
+
+    def simulate(self, transmissions, concurrent=False, chunk_size=1024):
+        # Yields a result per transmission, holding the lock for one chunk at a time so a slow reader
+        # of the stream does not block other requests. With concurrent, each chunk is in flight together
+        for start in range(0, len(transmissions), chunk_size):
+            with self.lock:
+                results = self.simulation.simulate_batch(transmissions[start:start + chunk_size], self.switched, concurrent)
+            for offset, result in enumerate(results):
+                yield dict(result, index=start + offset)
+
+    def plot_url(self, fmt='png'):
+        with self.lock:
+            image = self.images.get(fmt)
+            if image is None:
+                if not self.images:
+                    with metrics.phase('layout'):
+                        self.positions = topology_renderer.layout(self.simulation.topology)
+                with metrics.phase('render'):
+                    image = self.images[fmt] = topology_renderer.render(self.simulation.topology, self.positions, fmt)
+            token = self.tokens.get(fmt)
+            if token is None or render_store.get(token) is None:
+                token = self.tokens[fmt] = render_store.put(image, TopologyRenderer.formats[fmt], token)
+        return url_for('rendered_plot', token=token)
+
+class ScenarioCache:
+    # LRU cache of scenarios keyed by topology parameters, bounded by entry count and bytes
+    def __init__(self, max_entries=32, max_bytes=256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> (scenario, bytes accounted for it)
+        self.current_bytes = 0
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return entry[0]
+
+    def put(self, key, scenario):
+        with self._lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.current_bytes -= previous[1]
+            size = scenario.nbytes
+            if size > self.max_bytes:
+                return scenario  # Too big to keep; the caller still gets to use it
+            self.entries[key] = (scenario, size)
+            self.current_bytes += size
+            self._evict()
+            return scenario
+
+    def refresh(self, scenario):
+        # Re-measures a cached scenario after its details or plots have been filled in
+        with self._lock:
+            for key, (cached, size) in self.entries.items():
+                if cached is scenario:
+                    self.entries[key] = (scenario, scenario.nbytes)
+                    self.current_bytes += self.entries[key][1] - size
+                    break
+            self._evict()
+
+    def _evict(self):
+        while len(self.entries) > self.max_entries or self.current_bytes > self.max_bytes:
+            _, (_, size) = self.entries.popitem(last=False)
+            self.current_bytes -= size
+            self.stats['evictions'] += 1
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self.entries
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.current_bytes = 0
+
+    def info(self):
+        with self._lock:
+            return dict(self.stats, entries=len(self.entries), bytes=self.current_bytes,
+                        max_entries=self.max_entries, max_bytes=self.max_bytes)
+
+scenario_cache = ScenarioCache()
+
+def scenario_key(topology_type, counts):
+    # counts is [num_devices], or the device count of every star when topology_type is 'switch'
+    if topology_type == 'switch':
+        return ('switch', tuple(counts))
+    return ('network', topology_type, counts[0])
+
+def scenario_size(topology_type, counts):
+    # (devices, links) the network will have
+    if topology_type == 'switch':
+        devices = sum(counts) + len(counts) + 2  # Hosts, hubs, the switch and the router
+        return devices, devices - 1
+    n = counts[0]
+    if topology_type == 'star':
+        return n + 1, n
+    if topology_type == 'mesh':
+        return 2 * n, n + n * (n - 1) // 2
+    return 2 * n, 2 * n
+
+def check_size(topology_type, counts):
+    # Rejects networks no request should build; returns their cost (devices plus links, plus
+    # the expected layout work)
+    if not counts or min(counts) < 1:
+        raise ValueError("Device counts must be positive")
+    devices, links = scenario_size(topology_type, counts)
+    if devices > MAX_DEVICES:
+        raise ValueError(f"At most {MAX_DEVICES} devices are supported, this network has {devices}")
+    if links > MAX_LINKS:
+        raise ValueError(f"At most {MAX_LINKS} links are supported, this network has {links}")
+    return devices + links + topology_renderer.layout_cost(topology_type, devices, links)
+
+def simulation_params(fields):
+    # The form's fields (or the same names in a JSON body) for one simulation, validated
+    if fields.get('use_switch') in ('yes', True):
+        topology_type = 'switch'
+        if 'devices_per_topology' in fields:
+            counts = [int(count) for count in fields['devices_per_topology']]
         else:
-            num_topologies = int(request.form['num_topologies'])
-            devices_per_topology = [int(request.form[f'num_devices_topology{i+1}']) for i in range(num_topologies)]
-            sender_id = request.form['sender_id']
-            receiver_id = request.form['receiver_id']
-            message = request.form['message']
-
-            simulation = Simulation()
-            success, path, broadcast_domains, collision_domains = simulation.run_simulation_with_switch(num_topologies, devices_per_topology, sender_id, receiver_id, message)
-            if success:
-                mac_addresses = {device.device_id: device.generate_mac_address() for device in simulation.topology.devices}
-                ip_addresses = {device.device_id: device.ipv4_address for device in simulation.topology.devices}
-                routing_tables = {device.ipv4_address: device.routing_table for device in simulation.topology.devices}
-                return render_template('index.html', plot_available=True, path=path, message=message, mac_addresses=mac_addresses, ip_addresses=ip_addresses, broadcast_domains=broadcast_domains, collision_domains=collision_domains, routing_tables=routing_tables)
+            counts = [int(fields[f'num_devices_topology{i+1}']) for i in range(int(fields['num_topologies']))]
+    else:
+        topology_type = str(fields['topology_type']).lower()
+        if topology_type not in LazyTopology.kinds:
+            raise ValueError(f"Unknown topology type {fields['topology_type']!r}")
+        counts = [int(fields['num_devices'])]
+    plot_format = fields.get('plot_format', 'png')
+    return {
+        'topology_type': topology_type,
+        'counts': counts,
+        'cost': check_size(topology_type, counts),
+        'sender_id': str(fields['sender_id']),
+        'receiver_id': str(fields['receiver_id']),
+        'message': str(fields['message']),
+        'plot_format': plot_format if plot_format in TopologyRenderer.formats else 'png',
+    }
+
+def build_scenario(topology_type, counts):
+    if topology_type == 'switch':
+        simulation = Simulation()
+        with metrics.phase('build'):
+            simulation.create_network_with_switch(len(counts), counts)
+            broadcast_domains = simulation.topology.calculate_broadcast_domains()
+        collision_domains = len(counts) + 1  # Number of star topologies equals collision domains
+        return simulation.prepare_scenario(broadcast_domains, collision_domains, switched=True)
+    simulation = Simulation(lazy=True)
+    with metrics.phase('build'):
+        simulation.create_network(counts[0], topology_type)
+        broadcast_domains = simulation.topology.calculate_broadcast_domains() - 1
+        collision_domains = simulation.topology.calculate_collision_domains()
+    return simulation.prepare_scenario(broadcast_domains, collision_domains)
+
+def cached_scenario(topology_type, counts):
+    key = scenario_key(topology_type, counts)
+    scenario = scenario_cache.get(key)
+    if scenario is None:
+        scenario = scenario_cache.put(key, build_scenario(topology_type, counts))
+    return scenario
+
+def run_job(params, connection, memory_limit=None):
+    # Job worker process: builds, delivers and renders one scenario, reporting each phase
+    if resource is not None and memory_limit:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+    try:
+        connection.send(('phase', 'build'))
+        scenario = build_scenario(params['topology_type'], params['counts'])
+        connection.send(('phase', 'path'))
+        path, delivery = scenario.deliver(params['sender_id'], params['receiver_id'], params['message'])
+        if not path:
+            connection.send(('error', "No path found between the sender and receiver."))
+            return
+        connection.send(('phase', 'routing'))
+        details = scenario.describe()
+        topology = scenario.simulation.topology
+        connection.send(('phase', 'layout'))
+        with metrics.phase('layout'):
+            positions = topology_renderer.layout(topology)
+        connection.send(('phase', 'render'))
+        with metrics.phase('render'):
+            image = topology_renderer.render(topology, positions, params['plot_format'])
+        switch_stats = scenario.simulation.switch_stats() if scenario.switched else None
+        connection.send(('done', {'path': path, 'delivery': delivery, 'details': details, 'switch_stats': switch_stats,
+                                  'message': params['message'], 'image': image, 'plot_format': params['plot_format'],
+                                  'metrics': metrics.snapshot()}))
+    except MemoryError:
+        connection.send(('error', "Memory limit exceeded."))
+    except Exception as error:
+        connection.send(('error', f"{type(error).__name__}: {error}"))
+    finally:
+        connection.close()
+
+class Job:
+    # One background simulation: its parameters, state, per-phase timings and result
+    phases = ('build', 'path', 'routing', 'layout', 'render')
+
+    def __init__(self, params):
+        self.job_id = uuid.uuid4().hex
+        self.params = params
+        self.state = 'queued'  # queued, running, done, failed or cancelled
+        self.phase = None
+        self.timings = {}  # phase -> [started, finished], monotonic clock
+        self.error = None
+        self.result = None
+        self.token = None  # RenderStore token of the plot
+        self.cancelled = False
+        self.created = time.time()
+        self.finished = None
+        self.version = 0  # Bumped on every change, for event streams
+        self.changed = threading.Condition()
+
+    @property
+    def terminal(self):
+        return self.state in ('done', 'failed', 'cancelled')
+
+    def update(self, **changes):
+        with self.changed:
+            now = time.monotonic()
+            if 'phase' in changes and self.phase is not None:
+                self.timings[self.phase][1] = now
+            for name, value in changes.items():
+                setattr(self, name, value)
+            if 'phase' in changes:
+                self.timings[self.phase] = [now, None]
+            if self.terminal and self.finished is None:
+                self.finished = time.time()
+                if self.phase is not None and self.timings[self.phase][1] is None:
+                    self.timings[self.phase][1] = now
+            self.version += 1
+            self.changed.notify_all()
+
+    def status(self):
+        with self.changed:
+            phases = []
+            for name in self.phases:
+                started, finished = self.timings.get(name, (None, None))
+                if started is None:
+                    state, seconds = 'pending', None
+                else:
+                    state = 'running' if finished is None else 'done'
+                    if finished is not None and name == self.phase and self.state in ('failed', 'cancelled'):
+                        state = self.state
+                    seconds = (finished or time.monotonic()) - started
+                phases.append({'name': name, 'state': state, 'seconds': seconds})
+            status = {'job_id': self.job_id, 'state': self.state, 'phase': self.phase, 'phases': phases, 'error': self.error,
+                      'created': self.created, 'finished': self.finished, 'version': self.version}
+            if self.state == 'done':
+                status['result_url'] = url_for('job_result', job_id=self.job_id)
+                status['path'] = self.result['path']
+                status['delivery'] = self.result['delivery']
+            return status
+
+    def plot_url(self):
+        with self.changed:
+            if self.token is None or render_store.get(self.token) is None:
+                self.token = render_store.put(self.result['image'], TopologyRenderer.formats[self.result['plot_format']], self.token)
+            return url_for('rendered_plot', token=self.token)
+
+class JobManager:
+    # Runs large simulations each in its own process, at most max_workers at a time. A watcher
+    # thread per job enforces the time limit and cancellation; the child caps its own address
+    # space. Finished jobs, with their results and plots, are dropped ttl seconds after they end
+    def __init__(self, max_workers=2, time_limit=300.0, memory_limit=2 * 1024 ** 3, ttl=900.0, max_pending=64):
+        self.time_limit = time_limit
+        self.memory_limit = memory_limit
+        self.ttl = ttl
+        self.max_pending = max_pending
+        self.jobs = OrderedDict()  # job_id -> Job, oldest first
+        self.slots = threading.BoundedSemaphore(max_workers)
+        self.context = multiprocessing.get_context('spawn')  # Forking would copy the server's threads and locks
+        self._lock = threading.Lock()
+
+    def submit(self, params):
+        self.expire()
+        job = Job(params)
+        with self._lock:
+            if sum(not pending.terminal for pending in self.jobs.values()) >= self.max_pending:
+                raise RuntimeError("Too many simulations are running, try again later.")
+            self.jobs[job.job_id] = job
+        threading.Thread(target=self._run, args=(job,), daemon=True).start()
+        return job
+
+    def get(self, job_id):
+        self.expire()
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def cancel(self, job_id):
+        # A queued job is cancelled on the spot; a running one is stopped by its watcher
+        job = self.get(job_id)
+        if job is not None:
+            with job.changed:
+                if job.state == 'queued':
+                    job.update(cancelled=True, state='cancelled', error="Cancelled.")
+                elif not job.terminal:
+                    job.update(cancelled=True)
+        return job
+
+    def info(self):
+        with self._lock:
+            states = [job.state for job in self.jobs.values()]
+        return {state: states.count(state) for state in ('queued', 'running', 'done', 'failed', 'cancelled')}
+
+    def expire(self):
+        now = time.time()
+        with self._lock:
+            expired = [job for job in self.jobs.values() if job.finished is not None and now - job.finished > self.ttl]
+            for job in expired:
+                del self.jobs[job.job_id]
+        for job in expired:
+            if job.token is not None:
+                render_store.discard(job.token)
+            job.result = None
+
+    def _run(self, job):
+        with self.slots:
+            with job.changed:
+                if job.terminal:  # Cancelled while it was queued
+                    return
+                job.update(state='running')
+            receiver, sender = self.context.Pipe(duplex=False)
+            process = self.context.Process(target=run_job, args=(job.params, sender, self.memory_limit), daemon=True)
+            try:
+                process.start()
+            except Exception as error:
+                job.update(state='failed', error=f"Could not start the simulation process: {error}")
+                receiver.close()
+                return
+            finally:
+                sender.close()
+            try:
+                self._watch(job, process, receiver)
+            finally:
+                if process.is_alive():
+                    process.terminate()
+                process.join()
+                receiver.close()
+            logger.info("Job %s %s", job.job_id, job.state, extra={'job_id': job.job_id, 'state': job.state, 'error': job.error})
+
+    def _watch(self, job, process, connection):
+        deadline = time.monotonic() + self.time_limit
+        while True:
+            if job.cancelled:
+                job.update(state='cancelled', error="Cancelled.")
+                return
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                job.update(state='failed', error=f"Time limit of {self.time_limit:g} s exceeded.")
+                return
+            if not connection.poll(min(remaining, 0.25)):
+                continue
+            try:
+                kind, payload = connection.recv()
+            except EOFError:
+                process.join(1)
+                job.update(state='failed', error=f"Simulation process exited unexpectedly (exit code {process.exitcode}).")
+                return
+            if kind == 'phase':
+                job.update(phase=payload)
+            elif kind == 'done':
+                metrics.merge(payload.pop('metrics'))  # The child's phase timings, so /metrics covers jobs too
+                job.update(state='done', result=payload)
+                return
             else:
-                return render_template('index.html', plot_available=False, error_message="No path found between the sender and receiver.")
+                job.update(state='failed', error=payload)
+                return
+
+job_manager = JobManager()
+
+def render_scenario(scenario, sender_id, receiver_id, message, plot_format='png'):
+    path, delivery = scenario.deliver(sender_id, receiver_id, message)
+    if not path:
+        return render_template('index.html', plot_available=False, error_message="No path found between the sender and receiver.")
+    if plot_format not in TopologyRenderer.formats:
+        plot_format = 'png'
+    details = scenario.describe()
+    plot_url = scenario.plot_url(plot_format)
+    scenario_cache.refresh(scenario)
+    switch_stats = scenario.simulation.switch_stats() if scenario.switched else None
+    with metrics.phase('template'):
+        return render_template('index.html', plot_available=True, plot_url=plot_url, path=path, message=message, delivery=delivery, switch_stats=switch_stats, **details)
+
+def api_scenario(spec):
+    # Topology spec of the batch API: {"type": "star"|"bus"|"ring"|"mesh", "num_devices": n}
+    # or {"type": "switch", "devices_per_topology": [n1, n2, ...]}
+    if not isinstance(spec, dict):
+        raise ValueError("topology must be an object")
+    topology_type = str(spec.get('type', '')).lower()
+    if topology_type == 'switch':
+        counts = [int(count) for count in spec['devices_per_topology']]
+    elif topology_type in LazyTopology.kinds:
+        counts = [int(spec['num_devices'])]
+    else:
+        raise ValueError(f"Unknown topology type {spec.get('type')!r}")
+    check_size(topology_type, counts)
+    return cached_scenario(topology_type, counts)
+
+def api_transmission(item):
+    # [sender_id, receiver_id, message] or {"sender_id": ..., "receiver_id": ..., "message": ...}
+    if isinstance(item, dict):
+        return str(item['sender_id']), str(item['receiver_id']), str(item.get('message', ''))
+    if not isinstance(item, (list, tuple)) or not 2 <= len(item) <= 3:
+        raise ValueError(f"transmission must be an object or [sender_id, receiver_id, message], got {item!r}")
+    sender_id, receiver_id, *message = item
+    return str(sender_id), str(receiver_id), str(message[0]) if message else ''
+
+@app.route('/api/simulate', methods=['POST'])
+def api_simulate():
+    spec = request.get_json(silent=True)
+    if not isinstance(spec, dict):
+        return jsonify(error="Expected a JSON object"), 400
+    plot_format = spec.get('render') or None  # Off by default; true means PNG
+    if not isinstance(plot_format, (bool, str, type(None))):
+        return jsonify(error="render must be a boolean or a plot format"), 400
+    if plot_format is True:
+        plot_format = 'png'
+    if plot_format is not None and plot_format not in TopologyRenderer.formats:
+        return jsonify(error=f"Unsupported plot format {plot_format!r}"), 400
+    if not isinstance(spec.get('transmissions', []), list):
+        return jsonify(error="transmissions must be a list"), 400
+    try:
+        transmissions = [api_transmission(item) for item in spec.get('transmissions', [])]
+        scenario = api_scenario(spec.get('topology'))
+    except (KeyError, TypeError, ValueError) as error:
+        return jsonify(error=f"Invalid request: {error}"), 400
+    header = {'devices': len(scenario.simulation.topology), 'transmissions': len(transmissions)}
+    if plot_format is not None:
+        header['plot_url'] = scenario.plot_url(plot_format)
+        scenario_cache.refresh(scenario)
+    results = scenario.simulate(transmissions, concurrent=bool(spec.get('concurrent')))
+
+    def stream():
+        yield json.dumps(header) + '\n'
+        for result in results:
+            yield json.dumps(result) + '\n'
+    return Response(stream(), mimetype='application/x-ndjson')
+
+@app.route('/render/<token>')
+def rendered_plot(token):
+    entry = render_store.get(token)
+    if entry is None:
+        abort(404)
+    image, mimetype = entry
+    return Response(image, mimetype=mimetype, headers={'Cache-Control': 'private, max-age=3600'})
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    fields = request.get_json(silent=True)
+    if not isinstance(fields, dict):
+        return jsonify(error="Expected a JSON object"), 400
+    try:
+        params = simulation_params(fields)
+    except (KeyError, TypeError, ValueError) as error:
+        return jsonify(error=f"Invalid request: {error}"), 400
+    try:
+        job = job_manager.submit(params)
+    except RuntimeError as error:
+        return jsonify(error=str(error)), 503
+    return jsonify(job.status()), 202, {'Location': url_for('job_status', job_id=job.job_id)}
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        abort(404)
+    return jsonify(job.status())
+
+@app.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    # Server-sent events: the job's status on every change, until it finishes
+    job = job_manager.get(job_id)
+    if job is None:
+        abort(404)
+
+    def stream():
+        seen = -1
+        while True:
+            with job.changed:
+                job.changed.wait_for(lambda: job.version != seen, timeout=15.0)
+                changed, seen = job.version != seen, job.version
+            if not changed:
+                yield ": keep-alive\n\n"
+                continue
+            status = job.status()
+            yield f"data: {json.dumps(status)}\n\n"
+            if status['state'] in ('done', 'failed', 'cancelled'):
+                return
+    return Response(stream_with_context(stream()), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    job = job_manager.cancel(job_id)
+    if job is None:
+        abort(404)
+    return jsonify(job.status())
+
+@app.route('/jobs/<job_id>/result')
+def job_result(job_id):
+    job = job_manager.get(job_id)
+    if job is None or job.state != 'done':
+        abort(404)
+    result = job.result
+    plot_url = job.plot_url()
+    with metrics.phase('template'):
+        return render_template('index.html', plot_available=True, plot_url=plot_url, path=result['path'], message=result['message'],
+                               delivery=result['delivery'], switch_stats=result['switch_stats'], **result['details'])
+
+@app.route('/cache')
+def cache_stats():
+    return jsonify(scenario_cache.info())
+
+@app.route('/metrics')
+def metrics_report():
+    # Phase timings since start (or the last reset), with cache, render store and job counts
+    if request.args.get('reset'):
+        metrics.reset()
+    memory = {'tracing': tracemalloc.is_tracing()}
+    if memory['tracing']:
+        memory['traced_bytes'], memory['peak_traced_bytes'] = tracemalloc.get_traced_memory()
+    if resource is not None:
+        memory['max_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return jsonify(phases=metrics.snapshot(), memory=memory, cache=scenario_cache.info(),
+                   renders=render_store.info(), jobs=job_manager.info())
+
+@app.route('/', methods=['GET', 'POST'])
+def index():
+    if request.method == 'POST':
+        try:
+            params = simulation_params(request.form)
+        except (KeyError, ValueError) as error:
+            return render_template('index.html', plot_available=False, error_message=f"Invalid input: {error}")
+        topology_type, counts = params['topology_type'], params['counts']
+        if params['cost'] > JOB_COST and scenario_key(topology_type, counts) not in scenario_cache:
+            try:
+                job = job_manager.submit(params)
+            except RuntimeError as error:
+                return render_template('index.html', plot_available=False, error_message=str(error)), 503
+            return render_template('index.html', plot_available=False, job=job.status())
+        scenario = cached_scenario(topology_type, counts)
+        return render_scenario(scenario, params['sender_id'], params['receiver_id'], params['message'], params['plot_format'])
     return render_template('index.html', plot_available=False)
 
+def api_flow(item):
+    # [sender_id, receiver_id, volume] or {"sender_id": ..., "receiver_id": ..., "volume": ...}
+    if isinstance(item, dict):
+        return str(item['sender_id']), str(item['receiver_id']), float(item['volume'])
+    if not isinstance(item, (list, tuple)) or len(item) != 3:
+        raise ValueError(f"flow must be an object or [sender_id, receiver_id, volume], got {item!r}")
+    sender_id, receiver_id, volume = item
+    return str(sender_id), str(receiver_id), float(volume)
+
+def api_traffic(topology, spec):
+    # {"model": "uniform"|"hotspot"|"gravity", "flows": n or null for every pair, ...generator options}
+    # or {"flows": [[sender_id, receiver_id, volume], ...]}
+    if not isinstance(spec, dict):
+        raise ValueError("traffic must be an object")
+    flows = spec.get('flows')
+    if isinstance(flows, list):
+        count = len(flows)
+    else:
+        num_flows = None if flows is None else int(flows)
+        endpoints = len(endpoint_indices(topology))
+        count = endpoints * (endpoints - 1) if num_flows is None else num_flows
+    if not 0 <= count <= MAX_FLOWS:
+        raise ValueError(f"A traffic matrix must have between 0 and {MAX_FLOWS} flows")
+    if isinstance(flows, list):
+        return TrafficMatrix.from_flows(topology, (api_flow(flow) for flow in flows))
+    seed = spec.get('seed')
+    model = spec.get('model', 'uniform')
+    if model == 'uniform':
+        return TrafficMatrix.uniform(topology, num_flows, float(spec.get('volume', 1000.0)), seed)
+    if model == 'hotspot':
+        return TrafficMatrix.hotspot(topology, num_flows, float(spec.get('volume', 1000.0)), int(spec.get('hotspots', 1)),
+                                     float(spec.get('fraction', 0.5)), seed)
+    if model == 'gravity':
+        return TrafficMatrix.gravity(topology, num_flows, float(spec.get('total', 1e6)), seed)
+    raise ValueError(f"Unknown traffic model {model!r}")
+
+@app.route('/api/load', methods=['POST'])
+def api_load():
+    spec = request.get_json(silent=True)
+    if not isinstance(spec, dict):
+        return jsonify(error="Expected a JSON object"), 400
+    try:
+        scenario = api_scenario(spec.get('topology'))
+        with scenario.lock:
+            matrix = api_traffic(scenario.simulation.topology, spec.get('traffic', {}))
+            report = scenario.simulation.simulate_load(matrix, top=int(spec.get('top', 10)))
+    except (KeyError, TypeError, ValueError) as error:
+        return jsonify(error=f"Invalid request: {error}"), 400
+    scenario_cache.refresh(scenario)
+    return jsonify(report)
+
 if __name__ == "__main__":
+    configure_logging(os.environ.get('NETSIM_LOG_LEVEL', 'INFO'), os.environ.get('NETSIM_LOG_FORMAT') == 'json')
+    if os.environ.get('NETSIM_TRACEMALLOC'):
+        tracemalloc.start()
+    if os.environ.get('NETSIM_PROFILE'):
+        enable_profiling(os.environ.get('NETSIM_PROFILE_DIR'))
     app.run(debug=True)
     
\ No newline at end of file
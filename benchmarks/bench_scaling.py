@@ -0,0 +1,143 @@
+# Scaling benchmark: sweeps num_devices for each topology type and for the switched network,
+# timing Simulation.run_simulation / run_simulation_with_switch end to end and per phase, and
+# measuring their peak memory with tracemalloc. Results are compared against a baseline file;
+# the script exits with status 1 when any case is slower or larger than its baseline allows.
+#
+#   python benchmarks/bench_scaling.py                      # run and check against baseline.json
+#   python benchmarks/bench_scaling.py --update-baseline    # record this machine's numbers
+#   python benchmarks/bench_scaling.py --types star mesh --sizes 100 1000 --json results.json
+import argparse
+import json
+import math
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import Simulation, metrics  # noqa: E402
+
+# Every sweep starts above the renderer's label_limit, since drawing a label per device costs
+# more than the rest of a small run, and the mesh stays below edge_limit, past which it is drawn
+# as clusters; either switch would make a larger network look cheaper than a smaller one
+DEFAULT_SIZES = {
+    'star': [200, 2000, 20000],
+    'bus': [100, 1000, 10000],
+    'ring': [100, 1000, 10000],
+    'mesh': [100, 200, 300],  # n(n+1)/2 links
+    'switch': [200, 2000, 20000],
+}
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+def run_case(topology_type, num_devices, hubs, lazy):
+    simulation = Simulation(lazy=lazy)
+    if topology_type == 'switch':
+        per_hub = max(1, num_devices // hubs)
+        ok = simulation.run_simulation_with_switch(hubs, [per_hub] * hubs, 'Device1_1', f'Device{hubs}_{per_hub}', 'benchmark')[0]
+    else:
+        ok = simulation.run_simulation(num_devices, topology_type, 'Device1', f'Device{num_devices}', 'benchmark')[0]
+    if not ok:
+        raise RuntimeError(f"{topology_type} with {num_devices} devices found no path")
+
+def measure(topology_type, num_devices, hubs, lazy, repeat):
+    # Best of repeat untraced runs for time, then one traced run for memory, since tracing
+    # slows allocation-heavy code several times over
+    best, phases = math.inf, {}
+    for _ in range(repeat):
+        metrics.reset()
+        started = time.perf_counter()
+        run_case(topology_type, num_devices, hubs, lazy)
+        seconds = time.perf_counter() - started
+        if seconds < best:
+            best, phases = seconds, {name: stats['total_seconds'] for name, stats in metrics.snapshot().items()}
+    tracemalloc.start()
+    try:
+        run_case(topology_type, num_devices, hubs, lazy)
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {'seconds': best, 'peak_bytes': peak_bytes, 'phases': phases}
+
+def case_name(topology_type, num_devices, lazy):
+    return f"{'lazy-' if lazy else ''}{topology_type}/{num_devices}"
+
+def check(result, baseline, time_tolerance, memory_tolerance, time_floor):
+    # Problems of one case against its baseline entry, if it has one. time_floor keeps
+    # millisecond-scale cases from failing on scheduler noise
+    if baseline is None:
+        return []
+    problems = []
+    if result['seconds'] > baseline['seconds'] * (1 + time_tolerance) + time_floor:
+        problems.append(f"time {result['seconds']:.3f} s > {baseline['seconds']:.3f} s baseline")
+    if result['peak_bytes'] > baseline['peak_bytes'] * (1 + memory_tolerance):
+        problems.append(f"peak {result['peak_bytes'] / 2**20:.1f} MiB > {baseline['peak_bytes'] / 2**20:.1f} MiB baseline")
+    return problems
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sweep network sizes and check for performance regressions.")
+    parser.add_argument('--types', nargs='+', choices=sorted(DEFAULT_SIZES), default=list(DEFAULT_SIZES))
+    parser.add_argument('--sizes', nargs='+', type=int, help="num_devices to sweep for every type (default: per-type sizes)")
+    parser.add_argument('--hubs', type=int, default=10, help="star topologies behind the switch")
+    parser.add_argument('--lazy', action='store_true', help="use closed-form topologies, as the web view does")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--update-baseline', action='store_true', help="write this run's numbers as the new baseline")
+    parser.add_argument('--time-tolerance', type=float, default=0.5, help="allowed slowdown over baseline, 0.5 = 50%%")
+    parser.add_argument('--time-floor', type=float, default=0.05, help="seconds of slowdown always allowed")
+    parser.add_argument('--memory-tolerance', type=float, default=0.2, help="allowed peak memory growth over baseline")
+    parser.add_argument('--json', help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+
+    # Warm-up: matplotlib loads fonts and builds its text and marker caches on the first labelled,
+    # unlabelled and clustered renders, which would otherwise land on the first cases measured
+    for topology_type, num_devices in (('star', 100), ('ring', 1000), ('star', 5000), ('switch', 1000)):
+        run_case(topology_type, num_devices, args.hubs, args.lazy)
+    results, regressions, shrinking = {}, [], []
+    print(f"{'case':<20}{'seconds':>10}{'peak MiB':>10}{'time exp':>10}{'mem exp':>10}  slowest phases")
+    for topology_type in args.types:
+        previous = None
+        for num_devices in args.sizes or DEFAULT_SIZES[topology_type]:
+            name = case_name(topology_type, num_devices, args.lazy)
+            result = results[name] = measure(topology_type, num_devices, args.hubs, args.lazy, args.repeat)
+            # Growth exponents against the previous size: ~1 is linear, ~2 quadratic
+            time_exponent = memory_exponent = ''
+            if previous is not None:
+                scale = math.log(num_devices / previous[0])
+                time_exponent = f"{math.log(result['seconds'] / previous[1]['seconds']) / scale:.2f}"
+                memory_exponent = f"{math.log(result['peak_bytes'] / previous[1]['peak_bytes']) / scale:.2f}"
+                if result['seconds'] < previous[1]['seconds'] or result['peak_bytes'] < previous[1]['peak_bytes']:
+                    shrinking.append(f"{name} is cheaper than {case_name(topology_type, previous[0], args.lazy)}")
+            previous = (num_devices, result)
+            slowest = sorted(result['phases'].items(), key=lambda item: -item[1])[:3]
+            print(f"{name:<20}{result['seconds']:>10.3f}{result['peak_bytes'] / 2**20:>10.1f}{time_exponent:>10}{memory_exponent:>10}  "
+                  + ", ".join(f"{phase} {seconds:.3f}" for phase, seconds in slowest), flush=True)
+            for problem in check(result, baseline.get(name), args.time_tolerance, args.memory_tolerance, args.time_floor):
+                regressions.append(f"{name}: {problem}")
+
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump(results, output, indent=2)
+    if args.update_baseline:
+        if shrinking:
+            # A curve that falls with size means noise or a changed rendering mode, not a usable baseline
+            for problem in shrinking:
+                print(f"NOT MONOTONIC {problem}")
+            print("Baseline not written")
+            return 1
+        baseline.update((name, {'seconds': result['seconds'], 'peak_bytes': result['peak_bytes']}) for name, result in results.items())
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump(baseline, baseline_file, indent=2, sort_keys=True)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
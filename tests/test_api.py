@@ -0,0 +1,74 @@
+# Batch JSON API: NDJSON streaming of many transmissions and validation of the request body.
+#
+#   python -m unittest discover tests
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+class SimulateRouteTests(unittest.TestCase):
+    def setUp(self):
+        self.client = app.app.test_client()
+
+    def simulate(self, body):
+        response = self.client.post('/api/simulate', json=body)
+        self.assertEqual((response.status_code, response.mimetype), (200, 'application/x-ndjson'))
+        return [json.loads(line) for line in response.data.decode().splitlines()]
+
+    def test_results_stream_one_line_per_transmission(self):
+        header, *results = self.simulate({
+            'topology': {'type': 'ring', 'num_devices': 6},
+            'transmissions': [['Device1', 'Device4', 'a'], {'sender_id': 'Device2', 'receiver_id': 'Nowhere', 'message': 'b'},
+                              ('Device3', 'Device3')],
+            'render': 'svg'})
+        self.assertEqual((header['devices'], header['transmissions']), (12, 3))
+        self.assertEqual([result['index'] for result in results], [0, 1, 2])
+        self.assertEqual((results[0]['path'][0], results[0]['path'][-1]), ('Device1', 'Device4'))
+        self.assertEqual(results[0]['hops'], len(results[0]['path']) - 1)
+        self.assertTrue(results[0]['delivery']['delivered'])
+        self.assertIn('error', results[1])
+        self.assertEqual(results[2]['delivery']['hops'], 0)
+        plot = self.client.get(header['plot_url'])
+        self.assertEqual((plot.status_code, plot.mimetype), (200, 'image/svg+xml'))
+
+    def test_batch_matches_single_deliveries(self):
+        pairs = [('Device1_1', 'Device2_2'), ('Device2_1', 'Device1_2')]
+        header, *results = self.simulate({'topology': {'type': 'switch', 'devices_per_topology': [2, 2]},
+                                          'transmissions': [[sender, receiver, 'x'] for sender, receiver in pairs]})
+        self.assertNotIn('plot_url', header)
+        for (sender_id, receiver_id), result in zip(pairs, results):
+            simulation = app.Simulation()
+            simulation.create_network_with_switch(2, [2, 2])
+            self.assertEqual(result['path'], simulation.check_message_path(sender_id, receiver_id))
+
+    def test_concurrent_batches_contend(self):
+        body = {'topology': {'type': 'star', 'num_devices': 3},
+                'transmissions': [['Device1', 'Device2', 'x' * 100], ['Device1', 'Device3', 'x' * 100]]}
+        _, first, second = self.simulate(dict(body, concurrent=True))
+        self.assertGreater(second['delivery']['delivery_time'], first['delivery']['delivery_time'])
+        _, first, second = self.simulate(body)
+        self.assertAlmostEqual(second['delivery']['delivery_time'], first['delivery']['delivery_time'])
+
+    def test_bad_requests_are_rejected(self):
+        topology = {'type': 'star', 'num_devices': 3}
+        for body in ({'topology': topology, 'render': ['png']},
+                     {'topology': topology, 'render': {'fmt': 'png'}},
+                     {'topology': topology, 'render': 'gif'},
+                     {'topology': topology, 'transmissions': ['Device1Device2']},
+                     {'topology': topology, 'transmissions': [['Device1']]},
+                     {'topology': topology, 'transmissions': [['Device1', 'Device2', 'x', 'y']]},
+                     {'topology': topology, 'transmissions': [7]},
+                     {'topology': topology, 'transmissions': {'Device1': 'Device2'}},
+                     {'topology': topology, 'transmissions': 'Device1'},
+                     {'topology': {'type': 'torus', 'num_devices': 3}},
+                     {'topology': {'type': 'star', 'num_devices': 0}},
+                     {'topology': {'type': 'switch', 'devices_per_topology': []}},
+                     [1, 2]):
+            self.assertEqual(self.client.post('/api/simulate', json=body).status_code, 400, body)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+# Scenario cache: LRU bounds, reuse across requests, and the /cache route.
+#
+#   python -m unittest discover tests
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+class Sized:
+    def __init__(self, nbytes):
+        self.nbytes = nbytes
+
+class ScenarioCacheTests(unittest.TestCase):
+    def test_least_recently_used_is_evicted(self):
+        cache = app.ScenarioCache(max_entries=2)
+        first, second, third = Sized(1), Sized(1), Sized(1)
+        cache.put('a', first)
+        cache.put('b', second)
+        self.assertIs(cache.get('a'), first)
+        cache.put('c', third)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(list(cache.entries), ['a', 'c'])
+        self.assertEqual(cache.info()['evictions'], 1)
+
+    def test_byte_budget(self):
+        cache = app.ScenarioCache(max_bytes=100)
+        cache.put('a', Sized(60))
+        cache.put('b', Sized(60))
+        self.assertEqual((list(cache.entries), cache.current_bytes), (['b'], 60))
+        huge = Sized(101)
+        self.assertIs(cache.put('c', huge), huge)  # Returned to the caller but not kept
+        self.assertNotIn('c', cache.entries)
+        cache.put('b', Sized(10))
+        self.assertEqual(cache.current_bytes, 10)
+        cache.clear()
+        self.assertEqual(cache.info()['entries'], 0)
+
+    def test_scenarios_are_reused(self):
+        app.scenario_cache.clear()
+        scenario = app.cached_scenario('ring', [6])
+        self.assertIs(app.cached_scenario('ring', [6]), scenario)
+        switched = app.cached_scenario('switch', [2, 3])
+        self.assertIs(app.cached_scenario('switch', [2, 3]), switched)
+        other = app.cached_scenario('switch', [3, 2])
+        self.assertIsNot(other, switched)
+        self.assertEqual(scenario.images, {})  # Rendered on first use
+        with app.app.test_request_context():
+            scenario.plot_url('png')
+        app.scenario_cache.refresh(scenario)
+        self.assertGreater(scenario.nbytes, len(scenario.images['png']))
+        self.assertEqual(app.scenario_cache.info()['bytes'], sum(entry.nbytes for entry in (scenario, switched, other)))
+
+class CacheRouteTests(unittest.TestCase):
+    form = {'use_switch': 'no', 'num_devices': '5', 'topology_type': 'star',
+            'sender_id': 'Device1', 'receiver_id': 'Device3', 'message': 'hello'}
+
+    def setUp(self):
+        self.client = app.app.test_client()
+        app.scenario_cache.clear()
+
+    def test_repeated_requests_hit_the_cache(self):
+        self.assertEqual(self.client.get('/').status_code, 200)
+        before = self.client.get('/cache').get_json()
+        for _ in range(2):
+            response = self.client.post('/', data=self.form)
+            self.assertIn(b'Network Topology Graph', response.data)
+        after = self.client.get('/cache').get_json()
+        self.assertEqual((after['misses'] - before['misses'], after['hits'] - before['hits']), (1, 1))
+        plot_url = response.data.decode().split('src="')[1].split('"')[0]
+        self.assertEqual(self.client.get(plot_url).mimetype, 'image/png')
+
+    def test_missing_path_reports_an_error(self):
+        response = self.client.post('/', data=dict(self.form, receiver_id='Device9'))
+        self.assertIn(b'No path found', response.data)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+# Discrete-event engine: event ordering, per-link serialization and delivery results.
+#
+#   python -m unittest discover tests
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+def hop_time(message, link=None):
+    link = link or app.Link()
+    return (len(message) + app.FRAME_OVERHEAD) * 8 / link.bandwidth + link.latency
+
+def simulation(num_devices, topology_type):
+    simulation = app.Simulation()
+    simulation.create_network(num_devices, topology_type)
+    return simulation
+
+class SchedulerTests(unittest.TestCase):
+    def test_events_run_in_time_then_insertion_order(self):
+        scheduler = app.EventScheduler()
+        seen = []
+        scheduler.schedule(2.0, seen.append, 'late')
+        scheduler.schedule(1.0, seen.append, 'first')
+        scheduler.schedule(1.0, seen.append, 'second')
+        self.assertEqual(scheduler.run(until=1.5), 1.0)
+        self.assertEqual((seen, scheduler.pending()), (['first', 'second'], 1))
+        self.assertEqual(scheduler.run(), 2.0)
+        self.assertEqual((seen[-1], scheduler.events_processed), ('late', 3))
+
+    def test_link_serializes_each_direction(self):
+        link = app.Link(latency=0.001, bandwidth=8000)  # One byte per millisecond
+        self.assertAlmostEqual(link.arrival_time(0.0, 'A', 10), 0.011)
+        self.assertAlmostEqual(link.arrival_time(0.0, 'A', 10), 0.021)  # Queued behind the first frame
+        self.assertAlmostEqual(link.arrival_time(0.0, 'B', 10), 0.011)  # The other direction is idle
+
+class DeliveryTests(unittest.TestCase):
+    def test_unicast_delivery_time_and_hops(self):
+        for topology_type, receiver_id in (('star', 'Device3'), ('bus', 'Device4'), ('ring', 'Device4'), ('mesh', 'Device4')):
+            network = simulation(5, topology_type)
+            path = network.check_message_path('Device1', receiver_id)
+            result = network.send_message(path, 'hello', receiver_id)
+            self.assertTrue(result['delivered'], topology_type)
+            self.assertEqual(result['hops'], len(path) - 1)
+            self.assertEqual(result['frames_generated'], len(path) - 1)
+            self.assertAlmostEqual(result['delivery_time'], (len(path) - 1) * hop_time('hello'))
+
+    def test_concurrent_frames_contend_for_links(self):
+        network = simulation(3, 'star')
+        first, second = network.send_messages([('Device1', 'Device2', 'x' * 100), ('Device1', 'Device3', 'x' * 100)])
+        self.assertTrue(first['delivered'] and second['delivered'])
+        self.assertGreater(second['delivery_time'], first['delivery_time'])
+
+    def test_broadcast_reaches_every_device(self):
+        network = simulation(4, 'star')
+        result = network.broadcast('Device1', 'hi')
+        self.assertEqual(result['receptions'], 4)  # The hub and the three other hosts
+        self.assertEqual(result['hops'], 2)
+
+    def test_long_bus_runs_without_recursion(self):
+        network = simulation(2000, 'bus')
+        result = network.broadcast('Device1', 'hi')
+        self.assertEqual(result['receptions'], 2 * 2000 - 1)
+        self.assertEqual(result['hops'], 2001)  # Device1 -> Repeater1 ... Repeater2000 -> Device2000
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+# IPAM: per-segment allocation and release, segment growth, and longest-prefix-match routing.
+#
+#   python -m unittest discover tests
+import ipaddress
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+def star(num_devices):
+    topology = app.Topology()
+    hosts = [app.Device(f"Device{i+1}") for i in range(num_devices)]
+    topology.create_star_topology(hosts, app.Hub('Hub1'))
+    return topology, hosts
+
+class PrefixTrieTests(unittest.TestCase):
+    def test_longest_prefix_wins(self):
+        trie = app.PrefixTrie()
+        for prefix, value in (('0.0.0.0/0', 'default'), ('10.0.0.0/8', 'pool'), ('10.1.0.0/16', 'site'), ('10.1.2.3/32', 'host')):
+            trie.insert(*app.parse_prefix(prefix), value)
+        self.assertEqual(len(trie), 4)
+        for address, expected in (('10.1.2.3', (32, 'host')), ('10.1.9.9', (16, 'site')), ('10.2.0.1', (8, 'pool')), ('192.168.0.1', (0, 'default'))):
+            self.assertEqual(trie.lookup(app.parse_ipv4(address)), expected)
+        self.assertEqual(sorted(app.format_ipv4(network) for network, _, _ in trie.items()),
+                         ['0.0.0.0', '10.0.0.0', '10.1.0.0', '10.1.2.3'])
+
+class AllocationTests(unittest.TestCase):
+    def test_segments_are_aligned_and_disjoint(self):
+        ipam = app.IPAddressManager()
+        segments = [ipam.add_segment('a', 10), ipam.add_segment('b', 1000), ipam.add_segment('c', 3)]
+        self.assertEqual([segment.cidr for segment in segments], ['10.0.0.0/24', '10.0.4.0/22', '10.0.8.0/24'])
+        for segment in segments:
+            self.assertIs(ipam.segment_for(segment.network + 1), segment)
+        self.assertIsNone(ipam.segment_for('10.0.2.1'))  # Alignment gap before the /22
+
+    def test_allocate_and_release_reuses_addresses(self):
+        ipam = app.IPAddressManager()
+        segment = ipam.add_segment('lan', 2, prefix_length=30)
+        first, second = ipam.allocate_many(segment, 2)
+        self.assertEqual((first, second), ('10.0.0.1', '10.0.0.2'))
+        self.assertEqual(segment.available, 0)
+        with self.assertRaises(ValueError):
+            ipam.allocate(segment)  # Network and broadcast addresses are never handed out
+        ipam.release(first)
+        self.assertEqual(ipam.allocate(segment), first)
+        with self.assertRaises(ValueError):
+            ipam.release('10.0.0.3')
+        with self.assertRaises(ValueError):
+            ipam.release('172.16.0.1')
+
+    def test_pool_exhaustion(self):
+        ipam = app.IPAddressManager('192.168.0.0/23')
+        ipam.add_segment('a')
+        ipam.add_segment('b')
+        with self.assertRaises(ValueError):
+            ipam.add_segment('c')
+
+class TopologyAddressTests(unittest.TestCase):
+    def assertUniqueAddresses(self, topology):
+        addresses = [device.ipv4_address for device in topology.devices]
+        self.assertEqual(len(set(addresses)), len(addresses))
+        for device in topology.devices:
+            self.assertIn(ipaddress.IPv4Address(device.ipv4_address), ipaddress.IPv4Network(device.segment.cidr))
+            self.assertIs(topology.device_by_address(device.ipv4_address), device)
+
+    def test_bulk_assignment_sizes_one_segment_per_hub(self):
+        topology, hosts = star(300)
+        topology.assign_ipv4_addresses()
+        self.assertUniqueAddresses(topology)
+        self.assertEqual({device.segment.cidr for device in topology.devices}, {'10.0.0.0/23'})
+
+    def test_per_device_assignment_grows_past_one_subnet(self):
+        topology, hosts = star(300)
+        for device in topology.devices:
+            device.assign_ipv4_address()
+        self.assertUniqueAddresses(topology)
+
+    def test_hub_grows_after_bulk_assignment(self):
+        topology, hosts = star(250)
+        topology.assign_ipv4_addresses()
+        hub = topology.get_device('Hub1')
+        for i in range(250, 270):
+            device = app.Device(f"Device{i+1}")
+            topology.create_connection(device, hub)
+            device.assign_ipv4_address()
+        self.assertUniqueAddresses(topology)
+        self.assertEqual(len(topology.anchor_segments['Hub1']), 2)
+        # Hosts on either of the hub's prefixes reach each other through the hub
+        first, last = topology.get_device('Device1'), topology.get_device('Device270')
+        self.assertIsNot(first.segment, last.segment)
+        self.assertIs(topology.lookup_route(first, last.ipv4_address), hub)
+        self.assertIs(topology.lookup_route(hub, last.ipv4_address), app.CONNECTED)
+
+    def test_removed_devices_release_their_address(self):
+        topology, hosts = star(3)
+        topology.assign_ipv4_addresses()
+        address = hosts[1].ipv4_address
+        topology.remove_device(hosts[1])
+        self.assertIsNone(topology.device_by_address(address))
+        replacement = app.Device('Device9')
+        topology.create_connection(replacement, topology.get_device('Hub1'))
+        self.assertEqual(replacement.assign_ipv4_address(), address)
+
+    def test_static_routes_use_longest_prefix(self):
+        topology, hosts = star(3)
+        topology.assign_ipv4_addresses()
+        topology.add_routing_entry(hosts[0], '0.0.0.0/0', 'Hub1')
+        topology.add_routing_entry(hosts[0], '192.168.1.0/24', 'Device2')
+        self.assertEqual(topology.lookup_route(hosts[0], '192.168.1.7').device_id, 'Device2')
+        self.assertEqual(topology.lookup_route(hosts[0], '8.8.8.8').device_id, 'Hub1')
+        self.assertIs(topology.lookup_route(hosts[0], hosts[2].ipv4_address), app.CONNECTED)
+        self.assertEqual(topology.routing_table(hosts[0])['0.0.0.0/0'], 'Hub1')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+# Background jobs: lifecycle over the /jobs routes, cancellation, start failures and size limits.
+#
+#   python -m unittest discover tests
+import json
+import os
+import sys
+import time
+import types
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+FORM = {'use_switch': 'no', 'num_devices': '8', 'topology_type': 'ring',
+        'sender_id': 'Device1', 'receiver_id': 'Device5', 'message': 'hello'}
+
+def wait_until_finished(job, timeout=120.0):
+    with job.changed:
+        job.changed.wait_for(lambda: job.terminal, timeout=timeout)
+    return job
+
+class JobManagerTests(unittest.TestCase):
+    def test_cancelling_a_queued_job_is_immediate(self):
+        manager = app.JobManager(max_workers=1)
+        manager.slots.acquire()  # Every worker slot is busy, so the job stays queued
+        try:
+            job = manager.submit(app.simulation_params(FORM))
+            self.assertEqual(job.state, 'queued')
+            self.assertEqual(manager.cancel(job.job_id).state, 'cancelled')
+            self.assertIsNotNone(job.finished)
+        finally:
+            manager.slots.release()
+        time.sleep(0.2)  # The job's thread gets the slot and must not start it
+        self.assertEqual((job.state, job.phase), ('cancelled', None))
+        self.assertEqual(manager.cancel(job.job_id).state, 'cancelled')
+        self.assertIsNone(manager.cancel('missing'))
+
+    def test_start_failure_fails_the_job(self):
+        manager = app.JobManager()
+        context = manager.context
+
+        class Unstartable(context.Process):
+            def start(self):
+                raise OSError("no more processes")
+
+        manager.context = types.SimpleNamespace(Pipe=context.Pipe, Process=Unstartable)
+        job = wait_until_finished(manager.submit(app.simulation_params(FORM)), timeout=10.0)
+        self.assertEqual(job.state, 'failed')
+        self.assertIn('no more processes', job.error)
+
+    def test_pending_jobs_are_bounded(self):
+        manager = app.JobManager(max_workers=1, max_pending=1)
+        manager.slots.acquire()
+        try:
+            job = manager.submit(app.simulation_params(FORM))
+            with self.assertRaises(RuntimeError):
+                manager.submit(app.simulation_params(FORM))
+            manager.cancel(job.job_id)
+        finally:
+            manager.slots.release()
+
+class JobSizeTests(unittest.TestCase):
+    def test_parameters_are_validated(self):
+        for fields in (dict(FORM, topology_type='torus'), dict(FORM, num_devices='0'), dict(FORM, num_devices='x'),
+                       dict(FORM, num_devices=str(app.MAX_DEVICES)), dict(FORM, topology_type='mesh', num_devices='3000')):
+            with self.assertRaises(ValueError, msg=fields):
+                app.simulation_params(fields)
+        params = app.simulation_params({'use_switch': True, 'devices_per_topology': [2, 3], 'sender_id': 'Device1_1',
+                                        'receiver_id': 'Device2_3', 'message': 'hi', 'plot_format': 'gif'})
+        self.assertEqual((params['topology_type'], params['counts'], params['plot_format']), ('switch', [2, 3], 'png'))
+
+    def test_layout_work_counts_toward_the_job_threshold(self):
+        devices, links = app.scenario_size('ring', [5000])
+        self.assertEqual(app.check_size('ring', [5000]), devices + links)  # Closed-form layout
+        self.assertLessEqual(app.check_size('switch', [1200, 1200]), app.JOB_COST)
+        self.assertGreater(app.check_size('switch', [1456, 1456]), app.JOB_COST)
+
+class JobRouteTests(unittest.TestCase):
+    def setUp(self):
+        self.client = app.app.test_client()
+
+    def test_job_lifecycle(self):
+        response = self.client.post('/jobs', json=FORM)
+        self.assertEqual(response.status_code, 202)
+        job_id = response.get_json()['job_id']
+        wait_until_finished(app.job_manager.get(job_id))
+        status = self.client.get(f'/jobs/{job_id}').get_json()
+        self.assertEqual(status['state'], 'done', status['error'])
+        self.assertTrue(all(phase['state'] == 'done' for phase in status['phases']))
+        events = self.client.get(f'/jobs/{job_id}/events').data.decode()
+        self.assertEqual(json.loads(events.split('data: ')[-1])['state'], 'done')
+        self.assertIn(b'Network Topology Graph', self.client.get(f'/jobs/{job_id}/result').data)
+        self.assertEqual(self.client.post(f'/jobs/{job_id}/cancel').get_json()['state'], 'done')
+
+    def test_bad_requests(self):
+        self.assertEqual(self.client.get('/jobs/missing').status_code, 404)
+        self.assertEqual(self.client.get('/jobs/missing/result').status_code, 404)
+        self.assertEqual(self.client.post('/jobs/missing/cancel').status_code, 404)
+        self.assertEqual(self.client.post('/jobs', json={'use_switch': 'no'}).status_code, 400)
+        self.assertEqual(self.client.post('/jobs', json=dict(FORM, topology_type='torus')).status_code, 400)
+        self.assertIn(b'Invalid input', self.client.post('/', data=dict(FORM, topology_type='torus')).data)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+# Lazy parametric topologies: closed-form paths and neighbors against the eager builders.
+#
+#   python -m unittest discover tests
+import os
+import sys
+import unittest
+
+import networkx as nx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+def build(num_devices, topology_type, lazy):
+    simulation = app.Simulation(lazy=lazy)
+    simulation.create_network(num_devices, topology_type)
+    return simulation.topology
+
+def edge_names(topology):
+    return {frozenset((topology.devices[i].device_id, topology.devices[j].device_id))
+            for i, neighbors in enumerate(topology.adjacency) for j in neighbors}
+
+class LazyTopologyTests(unittest.TestCase):
+    def test_paths_are_valid_shortest_paths(self):
+        for topology_type in app.LazyTopology.kinds:
+            for num_devices in (1, 2, 5, 6):
+                lazy = build(num_devices, topology_type, lazy=True)
+                graph = build(num_devices, topology_type, lazy=False).graph
+                for source in range(len(lazy)):
+                    for target in range(len(lazy)):
+                        path = lazy.shortest_path(source, target)
+                        self.assertEqual((path[0], path[-1]), (source, target))
+                        for i, j in zip(path, path[1:]):
+                            self.assertIn(j, lazy.neighbors(i), (topology_type, num_devices, path))
+                        names = [lazy.device_at(i).device_id for i in (source, target)]
+                        self.assertEqual(len(path) - 1, nx.shortest_path_length(graph, *names))
+                self.assertFalse(lazy.materialized)
+
+    def test_lookups_do_not_materialize(self):
+        lazy = build(1_000_000, 'ring', lazy=True)
+        self.assertEqual(len(lazy), 2_000_000)
+        self.assertEqual(lazy.index_of('Device500000'), 999_999)
+        self.assertEqual(lazy.index_of('Repeater1'), 0)
+        for missing in ('Device0', 'Device01', 'Device1000001', 'Hub1', 'Router3'):
+            self.assertNotIn(missing, lazy)
+        self.assertEqual(lazy.get_device('Device3').device_id, 'Device3')
+        self.assertEqual(len(lazy.shortest_path(1, lazy.index_of('Device500001'))), 500_003)
+        self.assertFalse(lazy.materialized)
+
+    def test_materialized_edges_match_eager_builders(self):
+        for topology_type in app.LazyTopology.kinds:
+            for num_devices in (1, 2, 3, 7):
+                lazy = build(num_devices, topology_type, lazy=True)
+                eager = build(num_devices, topology_type, lazy=False)
+                self.assertEqual([device.device_id for device in lazy.devices],
+                                 [device.device_id for device in eager.devices])
+                for index in range(len(lazy)):
+                    self.assertEqual(set(lazy.neighbors(index)), eager.adjacency[index])
+                self.assertEqual(edge_names(lazy), edge_names(eager))
+                self.assertTrue(lazy.materialized)
+
+    def test_editing_materializes(self):
+        lazy = build(4, 'bus', lazy=True)
+        lazy.create_connection(lazy.get_device('Device1'), app.Device('Device9'))
+        self.assertTrue(lazy.materialized)
+        self.assertEqual(len(lazy.shortest_path(lazy.index_of('Device9'), lazy.index_of('Device4'))), 7)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+# Traffic-matrix load simulation: vectorized and closed-form loads against per-flow brute force,
+# lazy topologies against their materialized form, and the /api/load route.
+#
+#   python -m unittest discover tests
+import os
+import random
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+def random_topology(rng, num_devices, extra_links):
+    # A random spanning tree plus extra_links random links, so it is connected
+    topology = app.Topology()
+    topology.add_devices([app.Device(f"Device{i+1}") for i in range(num_devices)])
+    for i in range(1, num_devices):
+        topology.link(i, rng.randrange(i))
+    for _ in range(extra_links):
+        topology.link(*rng.sample(range(num_devices), 2))
+    return topology
+
+def brute_force_load(topology, matrix):
+    # Every flow walked hop by hop along topology.shortest_path
+    edge_load, device_load = {}, np.zeros(len(topology))
+    for source, destination, volume in zip(matrix.sources.tolist(), matrix.destinations.tolist(), matrix.volumes.tolist()):
+        path = topology.shortest_path(source, destination)
+        for hop in zip(path, path[1:]):
+            edge_load[hop] = edge_load.get(hop, 0.0) + volume
+        device_load[path] += volume
+    return edge_load, device_load
+
+def switch_simulation(counts):
+    simulation = app.Simulation()
+    simulation.create_network_with_switch(len(counts), counts)
+    return simulation
+
+class LoadTests(unittest.TestCase):
+    def assertLoadsMatch(self, topology, matrix):
+        edge_load, device_load, dropped = topology.traffic_load(matrix, workers=1)
+        expected_edges, expected_devices = brute_force_load(topology, matrix)
+        indptr, indices = topology.adjacency_csr()
+        owners = np.repeat(np.arange(len(topology)), np.diff(indptr))
+        loads = {(int(i), int(j)): float(load) for i, j, load in zip(owners, indices, edge_load) if load}
+        self.assertEqual(loads.keys(), expected_edges.keys())
+        for hop, load in expected_edges.items():
+            self.assertAlmostEqual(loads[hop], load, places=6)
+        np.testing.assert_allclose(device_load, expected_devices)
+        self.assertEqual(dropped, 0.0)
+
+    def test_tree_loads_match_brute_force(self):
+        rng = random.Random(3)
+        for num_devices, extra_links in ((10, 0), (25, 5), (40, 60)):
+            topology = random_topology(rng, num_devices, extra_links)
+            self.assertLoadsMatch(topology, app.TrafficMatrix.uniform(topology, 400, 1000.0, seed=num_devices))
+        simulation = switch_simulation([3, 4, 5])
+        self.assertLoadsMatch(simulation.topology, app.TrafficMatrix.gravity(simulation.topology, None, 1e6, seed=4))
+
+    def test_closed_form_loads_match_brute_force(self):
+        for kind in app.LazyTopology.kinds:
+            for num_devices in (1, 2, 5, 8):
+                topology = app.LazyTopology(kind, num_devices)
+                self.assertLoadsMatch(topology, app.TrafficMatrix.uniform(topology, None, 1000.0))
+                self.assertFalse(topology.materialized)
+
+    def test_lazy_paths_match_materialized(self):
+        for kind in app.LazyTopology.kinds:
+            for num_devices in range(1, 9):
+                lazy = app.LazyTopology(kind, num_devices)
+                eager = app.LazyTopology(kind, num_devices)
+                eager.materialize()
+                for lazy_part, eager_part in zip(lazy.adjacency_csr(), eager.adjacency_csr()):
+                    np.testing.assert_array_equal(lazy_part, eager_part)
+                for source in range(len(lazy)):
+                    for target in range(len(lazy)):
+                        self.assertEqual(lazy.shortest_path(source, target), eager.shortest_path(source, target), (kind, num_devices))
+                self.assertFalse(lazy.materialized)
+
+    def test_lazy_load_runs_are_repeatable(self):
+        for kind in app.LazyTopology.kinds:
+            simulation = app.Simulation(lazy=True)
+            simulation.create_network(4, kind)
+            matrix = app.TrafficMatrix.uniform(simulation.topology, None, 1000.0)
+            first = simulation.simulate_load(matrix, workers=1)
+            self.assertEqual(simulation.simulate_load(matrix, workers=1), first)
+            self.assertFalse(simulation.topology.materialized)
+            simulation.topology.materialize()
+            self.assertEqual(simulation.simulate_load(matrix, workers=1), first)
+
+    def test_pool_matches_serial(self):
+        topology = random_topology(random.Random(5), 60, 30)
+        matrix = app.TrafficMatrix.uniform(topology, 2000, 10.0, seed=5)
+        serial = topology.traffic_load(matrix, workers=1)
+        parallel = topology.traffic_load(matrix, workers=2, parallel_cells=1)
+        for expected, actual in zip(serial, parallel):
+            np.testing.assert_allclose(actual, expected)
+
+    def test_bad_volumes_are_rejected(self):
+        topology = app.LazyTopology('star', 3)
+        for volume in (-1.0, float('nan'), float('inf')):
+            with self.assertRaises(ValueError):
+                app.TrafficMatrix.from_flows(topology, [('Device1', 'Device2', volume)])
+            with self.assertRaises(ValueError):
+                app.TrafficMatrix.uniform(topology, None, volume)
+        self.assertEqual(app.TrafficMatrix.from_flows(topology, [('Device1', 'Device2', 0)]).total, 0.0)
+        with self.assertRaises(ValueError):
+            app.Simulation().simulate_load(app.TrafficMatrix([], [], []), top=-1)
+
+class LoadRouteTests(unittest.TestCase):
+    def setUp(self):
+        self.client = app.app.test_client()
+
+    def test_generated_and_supplied_flows(self):
+        response = self.client.post('/api/load', json={'topology': {'type': 'star', 'num_devices': 5},
+                                                       'traffic': {'model': 'uniform', 'seed': 1}})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['flows'], 20)
+        response = self.client.post('/api/load', json={'topology': {'type': 'switch', 'devices_per_topology': [2, 3]},
+                                                       'traffic': {'flows': [['Device1_1', 'Device2_3', 1500]]}})
+        report = response.get_json()
+        self.assertEqual(report['offered_volume'], 1500.0)
+        self.assertEqual(report['bottleneck_links'][0]['load'], 1500.0)
+
+    def test_bad_requests_are_rejected(self):
+        topology = {'type': 'star', 'num_devices': 5}
+        for body in ({'topology': topology, 'traffic': {'model': 'zipf'}},
+                     {'topology': topology, 'traffic': {'flows': [['Device1', 'Device2', -5]]}},
+                     {'topology': topology, 'traffic': {'flows': [['Device1', 'Device2', 'nan']]}},
+                     {'topology': topology, 'traffic': {'flows': [{'sender_id': 'Device1', 'receiver_id': 'Device2', 'volume': 'inf'}]}},
+                     {'topology': topology, 'traffic': {'flows': ['abc']}},
+                     {'topology': topology, 'traffic': {'model': 'uniform', 'volume': -1}},
+                     {'topology': topology, 'traffic': {'model': 'gravity', 'total': -1e6}},
+                     {'topology': topology, 'top': -1},
+                     {'topology': topology, 'traffic': {'flows': [['Device1', 'Nowhere', 1]]}}):
+            self.assertEqual(self.client.post('/api/load', json=body).status_code, 400, body)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+# Observability: phase metrics, the /metrics route, JSON logging and the benchmark's baseline check.
+#
+#   python -m unittest discover tests
+import io
+import json
+import logging
+import os
+import sys
+import tracemalloc
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+from benchmarks import bench_scaling  # noqa: E402
+
+class MetricsTests(unittest.TestCase):
+    def test_record_aggregates(self):
+        metrics = app.Metrics()
+        metrics.record('build', 0.25)
+        metrics.record('build', 0.75, peak_bytes=100)
+        metrics.record('build', 0.5, peak_bytes=40)
+        stats = metrics.snapshot()['build']
+        self.assertEqual((stats['count'], stats['max_seconds'], stats['last_seconds'], stats['peak_bytes']), (3, 0.75, 0.5, 100))
+        self.assertAlmostEqual(stats['total_seconds'], 1.5)
+        self.assertAlmostEqual(stats['mean_seconds'], 0.5)
+        metrics.reset()
+        self.assertEqual(metrics.snapshot(), {})
+
+    def test_merge_folds_in_another_snapshot(self):
+        parent, child = app.Metrics(), app.Metrics()
+        parent.record('render', 1.0)
+        child.record('render', 2.0, peak_bytes=10)
+        child.record('render', 0.5)
+        parent.merge(child.snapshot())
+        stats = parent.snapshot()['render']
+        self.assertEqual((stats['count'], stats['max_seconds'], stats['last_seconds'], stats['peak_bytes']), (3, 2.0, 0.5, 10))
+        self.assertAlmostEqual(stats['total_seconds'], 3.5)
+
+    def test_phase_records_peak_memory_only_while_tracing(self):
+        metrics = app.Metrics()
+        with metrics.phase('plain'):
+            pass
+        tracemalloc.start()
+        try:
+            with metrics.phase('traced'):
+                block = bytearray(1 << 20)
+        finally:
+            tracemalloc.stop()
+        del block
+        snapshot = metrics.snapshot()
+        self.assertIsNone(snapshot['plain']['peak_bytes'])
+        self.assertGreaterEqual(snapshot['traced']['peak_bytes'], 1 << 20)
+
+    def test_simulation_phases(self):
+        app.metrics.reset()
+        app.Simulation().run_simulation(5, 'ring', 'Device1', 'Device3', 'hello')
+        self.assertLessEqual({'build', 'path', 'delivery', 'ipv4', 'layout', 'render', 'routing'}, set(app.metrics.snapshot()))
+
+class MetricsRouteTests(unittest.TestCase):
+    def test_report(self):
+        client = app.app.test_client()
+        client.post('/', data={'use_switch': 'no', 'num_devices': '4', 'topology_type': 'star',
+                               'sender_id': 'Device1', 'receiver_id': 'Device2', 'message': 'hello'})
+        report = client.get('/metrics').get_json()
+        self.assertIn('build', report['phases'])
+        self.assertEqual(set(report['jobs']), {'queued', 'running', 'done', 'failed', 'cancelled'})
+        self.assertIn('entries', report['cache'])
+        self.assertFalse(report['memory']['tracing'])
+        self.assertEqual(client.get('/metrics?reset=1').get_json()['phases'], {})
+
+class LoggingTests(unittest.TestCase):
+    def setUp(self):
+        root = logging.getLogger()
+        self.addCleanup(setattr, root, 'handlers', root.handlers[:])
+        self.addCleanup(app.logger.setLevel, app.logger.level)
+
+    def test_json_lines_carry_extra_fields(self):
+        app.configure_logging('debug', json_output=True)
+        stream = io.StringIO()
+        logging.getLogger().handlers[0].setStream(stream)
+        self.assertEqual(app.logger.level, logging.DEBUG)
+        app.logger.info("Built %d devices", 3, extra={'phase': 'build'})
+        entry = json.loads(stream.getvalue())
+        self.assertEqual((entry['level'], entry['message'], entry['phase']), ('INFO', 'Built 3 devices', 'build'))
+        self.assertNotIn('args', entry)
+
+class BaselineCheckTests(unittest.TestCase):
+    def test_tolerances(self):
+        baseline = {'seconds': 1.0, 'peak_bytes': 1000}
+        self.assertEqual(bench_scaling.check({'seconds': 1.5, 'peak_bytes': 1200}, baseline, 0.5, 0.2, 0.0), [])
+        problems = bench_scaling.check({'seconds': 1.6, 'peak_bytes': 1300}, baseline, 0.5, 0.2, 0.05)
+        self.assertEqual(len(problems), 2)
+        self.assertEqual(bench_scaling.check({'seconds': 9.0, 'peak_bytes': 9}, None, 0.5, 0.2, 0.0), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+# In-memory rendering: image formats, deterministic layouts, the radial tree layout and /render.
+#
+#   python -m unittest discover tests
+import os
+import random
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+def switch_simulation(counts):
+    simulation = app.Simulation()
+    simulation.create_network_with_switch(len(counts), counts)
+    return simulation
+
+class LayoutTests(unittest.TestCase):
+    def test_closed_form_layouts_are_deterministic(self):
+        renderer = app.TopologyRenderer()
+        for topology_type in app.LazyTopology.kinds:
+            simulation = app.Simulation(lazy=True)
+            simulation.create_network(6, topology_type)
+            positions = renderer.layout(simulation.topology)
+            self.assertEqual(positions.shape, (len(simulation.topology), 2))
+            self.assertEqual(len({tuple(point) for point in positions.round(6).tolist()}), len(simulation.topology))
+            np.testing.assert_array_equal(renderer.layout(simulation.topology), positions)
+            self.assertFalse(simulation.topology.materialized)
+
+    def test_trees_get_a_radial_layout(self):
+        topology = switch_simulation([3, 4, 5]).topology
+        positions = app.TopologyRenderer().tree_layout(topology)
+        centre = topology.index_of('Switch1')
+        np.testing.assert_allclose(positions[centre], (0.0, 0.0), atol=1e-12)
+        radius = np.hypot(positions[:, 0], positions[:, 1])
+        for device in topology.devices:
+            depth = len(topology.shortest_path(centre, device.index)) - 1
+            self.assertAlmostEqual(radius[device.index], depth)
+        self.assertEqual(len({tuple(point) for point in positions.round(6).tolist()}), len(topology))
+
+    def test_graphs_with_cycles_are_not_trees(self):
+        simulation = app.Simulation()
+        simulation.create_network(5, 'ring')
+        self.assertIsNone(app.TopologyRenderer().tree_layout(simulation.topology))
+
+    def test_large_irregular_graphs_are_clustered(self):
+        rng = random.Random(0)
+        topology = app.Topology()
+        topology.add_devices([app.Device(f"Device{i+1}") for i in range(400)])
+        for i in range(1, 400):
+            topology.link(i, rng.randrange(i))
+        for _ in range(50):
+            topology.link(*rng.sample(range(400), 2))
+        renderer = app.TopologyRenderer()
+        self.assertIsNone(renderer.layout(topology))
+        self.assertTrue(renderer.render(topology).startswith(b'\x89PNG'))
+
+class RenderTests(unittest.TestCase):
+    def test_formats(self):
+        topology = switch_simulation([2, 2]).topology
+        renderer = app.TopologyRenderer()
+        self.assertTrue(renderer.render(topology, fmt='png').startswith(b'\x89PNG'))
+        self.assertIn(b'<svg', renderer.render(topology, fmt='svg'))
+        with self.assertRaises(ValueError):
+            renderer.render(topology, fmt='gif')
+
+    def test_run_simulation_keeps_the_image(self):
+        simulation = app.Simulation()
+        delivered, path, _, _ = simulation.run_simulation(4, 'star', 'Device1', 'Device2', 'hello')
+        self.assertTrue(delivered)
+        self.assertTrue(simulation.image.startswith(b'\x89PNG'))
+        switched = app.Simulation()
+        switched.run_simulation_with_switch(2, [2, 2], 'Device1_1', 'Device2_2', 'hello')
+        self.assertTrue(switched.image.startswith(b'\x89PNG'))
+
+    def test_render_store_is_bounded(self):
+        store = app.RenderStore(max_bytes=10)
+        first = store.put(b'x' * 6, 'image/png')
+        second = store.put(b'y' * 6, 'image/png')
+        self.assertIsNone(store.get(first))
+        self.assertEqual(store.get(second), (b'y' * 6, 'image/png'))
+        store.discard(second)
+        self.assertEqual(store.current_bytes, 0)
+
+    def test_render_route(self):
+        client = app.app.test_client()
+        token = app.render_store.put(b'<svg/>', 'image/svg+xml')
+        response = client.get(f'/render/{token}')
+        self.assertEqual((response.status_code, response.mimetype, response.data), (200, 'image/svg+xml', b'<svg/>'))
+        self.assertEqual(client.get('/render/missing').status_code, 404)
+
+if __name__ == '__main__':
+    unittest.main()
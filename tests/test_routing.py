@@ -0,0 +1,113 @@
+# Batched routing plane: paths against networkx and incremental updates against a full rebuild.
+#
+#   python -m unittest discover tests
+import os
+import random
+import sys
+import unittest
+
+import networkx as nx
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+def random_topology(rng, num_devices, extra_links):
+    # A random spanning tree plus extra_links random links, so it is connected
+    topology = app.Topology()
+    topology.add_devices([app.Device(f"Device{i+1}") for i in range(num_devices)])
+    for i in range(1, num_devices):
+        topology.link(i, rng.randrange(i))
+    for _ in range(extra_links):
+        topology.link(*rng.sample(range(num_devices), 2))
+    return topology
+
+def networkx_graph(topology):
+    graph = nx.Graph()
+    graph.add_nodes_from(range(len(topology)))
+    graph.add_edges_from((i, j) for i, neighbors in enumerate(topology.adjacency) for j in neighbors)
+    return graph
+
+class RoutingTests(unittest.TestCase):
+    def assertValidPaths(self, topology):
+        lengths = dict(nx.all_pairs_shortest_path_length(networkx_graph(topology)))
+        for source in range(len(topology)):
+            for target in range(len(topology)):
+                path = topology.shortest_path(source, target)
+                self.assertEqual(len(path) - 1, lengths[source][target], (source, target))
+                self.assertEqual((path[0], path[-1]), (source, target))
+                for i, j in zip(path, path[1:]):
+                    self.assertIn(j, topology.neighbors(i))
+
+    def assertMatchesRebuild(self, topology):
+        fresh = app.RoutingPlane(topology)
+        fresh.compute(range(len(topology)))
+        for destination in range(len(topology)):
+            topology.routing.row(destination)  # Rows for new destinations are computed on demand
+            np.testing.assert_array_equal(topology.routing.distance[destination], fresh.distance[destination])
+
+    def test_paths_match_networkx(self):
+        rng = random.Random(1)
+        for num_devices, extra_links in ((2, 0), (12, 0), (30, 10), (40, 80)):
+            self.assertValidPaths(random_topology(rng, num_devices, extra_links))
+
+    def test_ties_go_to_the_lowest_index(self):
+        topology = random_topology(random.Random(8), 200, 300)
+        indptr, indices = topology.adjacency_csr()
+        next_hop, distance = app.breadth_first_search(indptr, indices, range(len(topology)))
+        for destination in range(len(topology)):
+            for source in range(len(topology)):
+                if source != destination:
+                    closer = [j for j in topology.neighbors(source) if distance[destination, j] == distance[destination, source] - 1]
+                    self.assertEqual(next_hop[destination, source], min(closer))
+
+    def test_small_batches_match_one_batch(self):
+        topology = random_topology(random.Random(6), 50, 25)
+        whole = app.RoutingPlane(topology)
+        whole.compute(range(len(topology)))
+        batched = app.RoutingPlane(topology)
+        batched.batch_cells = 64
+        batched.compute(range(len(topology)))
+        for destination in range(len(topology)):
+            np.testing.assert_array_equal(batched.distance[destination], whole.distance[destination])
+
+    def test_unreachable_devices_have_no_path(self):
+        topology = random_topology(random.Random(7), 5, 0)
+        topology.add_device(app.Device('Device6'))
+        self.assertIsNone(topology.shortest_path(0, 5))
+        self.assertEqual(topology.routing.distance[5][0], -1)
+
+    def test_incremental_updates_match_rebuild(self):
+        rng = random.Random(2)
+        topology = random_topology(rng, 40, 20)
+        topology.routing.compute(range(len(topology)))
+        for step in range(60):
+            i, j = rng.sample(range(len(topology)), 2)
+            if step % 3 == 2 and topology.routing.distance[i][j] >= 0:
+                topology.unlink(i, j)
+            else:
+                topology.link(i, j)
+            self.assertMatchesRebuild(topology)
+        topology.add_device(app.Device('Device41'))
+        topology.link(40, 3)
+        self.assertMatchesRebuild(topology)
+        topology.remove_device(topology.device_at(7))
+        self.assertMatchesRebuild(topology)
+        self.assertValidPaths(topology)
+
+    def test_routing_tables_follow_next_hops(self):
+        simulation = app.Simulation()
+        simulation.create_network(4, 'ring')
+        topology = simulation.topology
+        topology.assign_ipv4_addresses()
+        topology.generate_routing_tables()
+        for source, table in topology.routing_tables.items():
+            self.assertEqual(len(table), len(topology) - 1)
+            for destination in range(len(topology)):
+                if destination != source:
+                    hop = topology.shortest_path(source, destination)[1]
+                    self.assertEqual(table[topology.devices[destination].ipv4_address], topology.devices[hop].ipv4_address)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+# Switch MAC learning: table counters, LRU eviction, aging, and forwarding through a switch.
+#
+#   python -m unittest discover tests
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+def switch_simulation(counts):
+    simulation = app.Simulation()
+    simulation.create_network_with_switch(len(counts), counts)
+    return simulation
+
+class MACTableTests(unittest.TestCase):
+    def test_hits_and_misses(self):
+        table = app.MACTable()
+        self.assertIsNone(table.lookup('aa', 0.0))
+        table.learn('aa', 3, 0.0)
+        self.assertEqual(table.lookup('aa', 1.0), 3)
+        table.learn('aa', 5, 2.0)  # A station that moved is relearned on its new port
+        self.assertEqual(table.lookup('aa', 2.0), 5)
+        self.assertEqual((table.stats['hits'], table.stats['misses'], len(table)), (2, 1, 1))
+
+    def test_least_recently_learned_entry_is_evicted(self):
+        table = app.MACTable(capacity=2)
+        table.learn('aa', 1, 0.0)
+        table.learn('bb', 2, 0.0)
+        table.learn('aa', 1, 1.0)
+        table.learn('cc', 3, 1.0)
+        self.assertEqual(list(table.entries), ['aa', 'cc'])
+        self.assertEqual(table.stats['evictions'], 1)
+
+    def test_entries_age_out(self):
+        table = app.MACTable(aging_time=10.0)
+        table.learn('aa', 1, 0.0)
+        self.assertEqual(table.lookup('aa', 10.0), 1)
+        self.assertIsNone(table.lookup('aa', 10.5))
+        self.assertEqual((table.stats['aged'], table.stats['misses'], len(table)), (1, 1, 0))
+
+    def test_remap_ports(self):
+        table = app.MACTable()
+        for mac_address, port in (('aa', 1), ('bb', 2), ('cc', 3)):
+            table.learn(mac_address, port, 0.0)
+        table.remap_ports(lambda port: None if port == 2 else port * 10)
+        self.assertEqual({mac: port for mac, (port, _) in table.entries.items()}, {'aa': 10, 'cc': 30})
+
+class SwitchForwardingTests(unittest.TestCase):
+    def test_first_frame_floods_then_switch_forwards(self):
+        simulation = switch_simulation([2, 2, 2])
+        first, reply, again = simulation.send_messages([('Device1_1', 'Device2_1', 'hello')]) + \
+            simulation.send_messages([('Device2_1', 'Device1_1', 'hi')]) + \
+            simulation.send_messages([('Device1_1', 'Device2_1', 'again')])
+        self.assertTrue(first['delivered'] and reply['delivered'] and again['delivered'])
+        stats = simulation.switch_stats()['Switch1']
+        self.assertEqual(stats['floods'], 1)  # Only the first frame, before Device2_1 was learned
+        self.assertEqual((stats['misses'], stats['hits']), (1, 2))
+        self.assertEqual(stats['entries'], 2)
+        self.assertLess(again['frames_generated'], first['frames_generated'])
+
+    def test_aged_entries_flood_again(self):
+        simulation = switch_simulation([1, 1])
+        switch = simulation.topology.get_device('Switch1')
+        switch.mac_table.aging_time = 0.0
+        simulation.send_messages([('Device1_1', 'Device2_1', 'hello')])
+        simulation.send_messages([('Device2_1', 'Device1_1', 'hi')])
+        self.assertEqual(switch.mac_table.stats['floods'], 2)
+        self.assertGreaterEqual(switch.mac_table.stats['aged'], 1)
+
+    def test_removing_a_port_forgets_its_stations(self):
+        simulation = switch_simulation([1, 1])
+        topology = simulation.topology
+        simulation.send_messages([('Device1_1', 'Device2_1', 'hello')])
+        simulation.send_messages([('Device2_1', 'Device1_1', 'hi')])
+        switch = topology.get_device('Switch1')
+        self.assertEqual(len(switch.mac_table), 2)
+        topology.remove_device(topology.get_device('Hub1'))
+        ports = {port for port, _ in switch.mac_table.entries.values()}
+        self.assertEqual(len(switch.mac_table), 1)
+        self.assertEqual(ports, {topology.index_of('Hub2')})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+# Indexed topology store: device indices, adjacency sets, link settings and the networkx view.
+#
+#   python -m unittest discover tests
+import os
+import sys
+import unittest
+
+import networkx as nx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+class TopologyStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.topology = app.Topology()
+        self.hub = app.Hub('Hub1')
+        self.hosts = [app.Device(f'Device{i+1}') for i in range(3)]
+        self.topology.create_star_topology(self.hosts, self.hub)
+
+    def test_devices_are_indexed_in_insertion_order(self):
+        topology = self.topology
+        self.assertEqual(len(topology), 4)
+        for position, device in enumerate(topology.devices):
+            self.assertEqual(device.index, position)
+            self.assertIs(topology.get_device(device.device_id), device)
+            self.assertIn(device.device_id, topology)
+        self.assertNotIn('Device9', topology)
+
+    def test_duplicate_ids_are_rejected(self):
+        with self.assertRaises(ValueError):
+            self.topology.add_device(app.Device('Device1'))
+        with self.assertRaises(ValueError):
+            self.topology.add_devices([app.Device('Device4'), app.Device('Hub1')])
+        self.assertEqual(self.topology.add_device(self.hosts[0]), self.hosts[0].index)  # Re-adding is a no-op
+
+    def test_links_are_symmetric_and_idempotent(self):
+        topology = self.topology
+        hub, first = self.hub.index, self.hosts[0].index
+        self.assertIn(first, topology.adjacency[hub])
+        self.assertIn(hub, topology.adjacency[first])
+        self.assertFalse(topology.link(hub, first))
+        self.assertFalse(topology.link(first, first))
+        self.assertEqual([device.device_id for device in self.hosts[0].connected_devices], ['Hub1'])
+
+    def test_link_settings_apply_to_created_links(self):
+        extra = app.Device('Device4')
+        self.assertTrue(self.topology.create_connection(self.hosts[0], extra, latency=0.5, bandwidth=1000))
+        link = self.topology.get_link(extra.index, self.hosts[0].index)
+        self.assertEqual((link.latency, link.bandwidth), (0.5, 1000))
+        self.assertIs(self.topology.get_link(self.hosts[0].index, extra.index), link)
+
+    def test_graph_view_matches_adjacency(self):
+        graph = self.topology.graph
+        self.assertEqual(set(graph.nodes), {'Hub1', 'Device1', 'Device2', 'Device3'})
+        self.assertEqual({frozenset(edge) for edge in graph.edges},
+                         {frozenset(('Hub1', f'Device{i+1}')) for i in range(3)})
+        self.topology.create_connection(self.hosts[0], self.hosts[1])
+        self.assertTrue(self.topology.graph.has_edge('Device1', 'Device2'))
+
+    def test_shortest_paths_are_index_paths(self):
+        simulation = app.Simulation()
+        simulation.create_network(6, 'ring')
+        topology = simulation.topology
+        graph = topology.graph
+        for source in range(len(topology)):
+            for target in range(len(topology)):
+                path = topology.shortest_path(source, target)
+                names = [topology.devices[i].device_id for i in path]
+                self.assertEqual(len(path) - 1, nx.shortest_path_length(graph, names[0], names[-1]))
+                for i, j in zip(path, path[1:]):
+                    self.assertIn(j, topology.adjacency[i])
+
+    def test_devices_use_slots(self):
+        self.assertFalse(hasattr(self.hosts[0], '__dict__'))
+
+if __name__ == '__main__':
+    unittest.main()